@@ -0,0 +1,153 @@
+"""Archival of old bills to compressed monthly segments in the storage bucket.
+
+`archive_bills` moves bills dated before a cutoff out of `bill` and `bill_item`,
+a chunk at a time. Each chunk is appended to its month's segment
+(`archive/bills-YYYY-MM.jsonl.gz`) as a new gzip member holding one JSON line per
+bill, and indexed in `archived_bill` with the member's byte range, so a lookup
+fetches (one ranged read) and inflates only that member. The bucket cannot append,
+so each chunk downloads and re-uploads its month's segment; larger chunks mean
+fewer rewrites. Bills are deleted only after the segment upload succeeded; a failed
+run leaves at most an unreferenced member behind, which the next append to that
+segment drops. Run one archiver at a time.
+
+Daily sales summary and search index rows are left in place, so reports and
+search keep covering archived bills. Each chunk's figures are also recorded in
+`archived_sales_summary`, which summary rebuilds add back. `iter_archived_bills`
+reads whole segments back for exports.
+"""
+import gzip
+import json
+import os
+from datetime import datetime
+from types import SimpleNamespace
+from sqlalchemy import func
+from sqlalchemy.orm import selectinload
+from models import db, Bill, BillItem, ArchivedBill
+from storage import download_range
+import reports
+
+ARCHIVE_PREFIX = 'archive'
+ARCHIVE_CHUNK_SIZE = int(os.environ.get('ARCHIVE_CHUNK_SIZE', 500))
+
+BILL_FIELDS = ('id', 'bill_number', 'date', 'company_name', 'shop_name', 'location', 'shop_address',
+               'shop_mobile', 'shop_mobile2', 'grand_total', 'advance_amount', 'discount_amount',
+               'balance_amount', 'party_number', 'pdf_path', 'qr_code_path')
+ITEM_FIELDS = ('item_name', 'quantity', 'unit_price', 'total_price', 'item_description')
+
+def segment_path(day):
+    return f"{ARCHIVE_PREFIX}/bills-{day.strftime('%Y-%m')}.jsonl.gz"
+
+def bill_record(bill):
+    record = {name: getattr(bill, name) for name in BILL_FIELDS}
+    record['date'] = bill.date.isoformat() if bill.date else None
+    record['items'] = [{name: getattr(item, name) for name in ITEM_FIELDS} for item in bill.items]
+    return record
+
+def _segment_bytes(bucket, segment):
+    """Current content of a segment, cut back to the members the index knows about"""
+    size = db.session.query(func.max(ArchivedBill.member_offset + ArchivedBill.member_length)) \
+        .filter(ArchivedBill.segment == segment).scalar()
+    if not size:
+        return b''
+    return bucket.download(segment)[:size]
+
+def _append_member(bucket, segment, bills):
+    existing = _segment_bytes(bucket, segment)
+    lines = ''.join(json.dumps(bill_record(bill), ensure_ascii=False) + '\n' for bill in bills)
+    member = gzip.compress(lines.encode('utf-8'), mtime=0)
+    bucket.upload(segment, existing + member, {'content-type': 'application/gzip', 'upsert': 'true'})
+    return len(existing), len(member)
+
+def archive_bills(bucket, cutoff, chunk_size=ARCHIVE_CHUNK_SIZE, limit=None):
+    """Move bills dated before `cutoff` into archive segments; returns the number archived"""
+    archived = 0
+    while limit is None or archived < limit:
+        size = chunk_size if limit is None else min(chunk_size, limit - archived)
+        bills = Bill.query.options(selectinload(Bill.items)).filter(Bill.date < cutoff) \
+            .order_by(Bill.date, Bill.id).limit(size).all()
+        if not bills:
+            break
+        by_segment = {}
+        for bill in bills:
+            by_segment.setdefault(segment_path(bill.date), []).append(bill)
+        for segment, group in by_segment.items():
+            offset, length = _append_member(bucket, segment, group)
+            db.session.add_all([
+                ArchivedBill(id=bill.id, bill_number=bill.bill_number, date=bill.date, location=bill.location,
+                             party_number=bill.party_number, grand_total=bill.grand_total or 0.0,
+                             segment=segment, member_offset=offset, member_length=length)
+                for bill in group
+            ])
+            # Flushed per segment so the next segment's size query sees these rows
+            db.session.flush()
+        reports.archive_sales_summary([(bill, bill.items) for bill in bills])
+        bill_ids = [bill.id for bill in bills]
+        last_day = bills[-1].date
+        BillItem.query.filter(BillItem.bill_id.in_(bill_ids)).delete(synchronize_session=False)
+        Bill.query.filter(Bill.id.in_(bill_ids)).delete(synchronize_session=False)
+        db.session.commit()
+        db.session.expunge_all()
+        archived += len(bills)
+        print(f" * Archive: moved {archived} bills so far (up to {last_day:%Y-%m-%d})")
+    return archived
+
+def _read_member(bucket, entry, cache=None):
+    key = f"{entry.segment}@{entry.member_offset}+{entry.member_length}"
+    if cache is not None:
+        cached = cache.get(key)
+        if cached:
+            with open(cached[0], 'rb') as f:
+                return f.read()
+    data = download_range(bucket, entry.segment, entry.member_offset, entry.member_length)
+    if cache is not None:
+        # Members are never rewritten, so a cached copy never goes stale
+        cache.put(key, data)
+    return data
+
+def _as_bill(record):
+    fields = {name: record.get(name) for name in BILL_FIELDS}
+    fields['date'] = datetime.fromisoformat(record['date']) if record.get('date') else None
+    items = [SimpleNamespace(**{name: item.get(name) for name in ITEM_FIELDS}) for item in record.get('items', [])]
+    return SimpleNamespace(items=items, archived=True, **fields)
+
+def iter_archived_bills(bucket, start=None, end=None):
+    """Archived bills dated in [start, end) as read-only Bill look-alikes, oldest first.
+
+    Each month's segment that holds a match is downloaded whole, one at a time.
+    """
+    query = db.session.query(ArchivedBill.segment).distinct()
+    if start is not None:
+        query = query.filter(ArchivedBill.date >= start)
+    if end is not None:
+        query = query.filter(ArchivedBill.date < end)
+    # bills-YYYY-MM names sort by month
+    for segment in sorted(segment for segment, in query):
+        data = _segment_bytes(bucket, segment)
+        bills = [_as_bill(json.loads(line)) for line in gzip.decompress(data).decode('utf-8').splitlines()]
+        bills = [bill for bill in bills
+                 if (start is None or bill.date >= start) and (end is None or bill.date < end)]
+        bills.sort(key=lambda bill: (bill.date, bill.id))
+        yield from bills
+
+def load_archived_bill(bucket, bill_number, cache=None):
+    """A read-only Bill look-alike (with .items) for an archived bill, or None"""
+    entry = ArchivedBill.query.filter_by(bill_number=bill_number).first()
+    if entry is None:
+        return None
+    for line in gzip.decompress(_read_member(bucket, entry, cache)).decode('utf-8').splitlines():
+        record = json.loads(line)
+        if record['bill_number'] == bill_number:
+            return _as_bill(record)
+    return None
+
+def archive_stats():
+    count, segments, oldest, newest = db.session.query(
+        func.count(ArchivedBill.id), func.count(func.distinct(ArchivedBill.segment)),
+        func.min(ArchivedBill.date), func.max(ArchivedBill.date)
+    ).one()
+    return {
+        'bills': count,
+        'segments': segments,
+        'oldest': oldest.isoformat() if oldest else None,
+        'newest': newest.isoformat() if newest else None
+    }
@@ -0,0 +1,28 @@
+import argparse
+from datetime import datetime, timedelta
+from index import app, get_storage_bucket
+import archive
+
+def main():
+    """Move bills older than a cutoff into compressed monthly archive segments"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    cutoff = parser.add_mutually_exclusive_group(required=True)
+    cutoff.add_argument('--before', help='archive bills dated before this day (YYYY-MM-DD)')
+    cutoff.add_argument('--older-than-days', type=int, help='archive bills older than this many days')
+    parser.add_argument('--chunk', type=int, default=archive.ARCHIVE_CHUNK_SIZE, help='bills per transaction')
+    parser.add_argument('--limit', type=int, help='stop after this many bills')
+    args = parser.parse_args()
+
+    if args.before:
+        before = datetime.strptime(args.before, '%Y-%m-%d')
+    else:
+        before = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=args.older_than_days)
+
+    with app.app_context():
+        print(f"Archiving bills dated before {before:%Y-%m-%d}")
+        count = archive.archive_bills(get_storage_bucket(), before, chunk_size=args.chunk, limit=args.limit)
+        print(f"Archived {count} bills")
+        print(f"Archive: {archive.archive_stats()}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+"""ASGI entry point: an async storage proxy in front of the Flask app.
+
+    pip install uvicorn
+    uvicorn asgi:app --host 0.0.0.0 --port 8000
+
+Bucket objects behind `/uploads/<path>` (when Supabase is configured) are served on
+the event loop: the local disk cache is checked first, and a miss is fetched with
+storage3's async client, so any number of slow proxy requests wait without holding
+a thread. Every other request runs the Flask app unchanged in a bounded thread
+pool (`ASGI_THREADS`), which those proxies no longer occupy, so checkout keeps
+its threads while images are slow. The WSGI entry points (index.app on Vercel,
+`python index.py`) are untouched.
+"""
+import hashlib
+import io
+import mimetypes
+import os
+import sys
+import time
+import anyio
+from anyio import from_thread, to_thread
+from werkzeug.http import parse_etags
+from index import (app as flask_app, SUPABASE_URL, SUPABASE_KEY, SUPABASE_BUCKET, UPLOAD_CACHE_CONTROL,
+                   get_upload_cache, request_metrics)
+import metrics
+import uploads
+
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 16))
+
+_flask_limiter = None
+_storage_client = None
+
+def get_async_storage():
+    """storage3's async client for the Supabase bucket, or None when Supabase isn't configured"""
+    global _storage_client
+    if _storage_client is None and SUPABASE_URL and SUPABASE_KEY:
+        from storage3 import AsyncStorageClient
+        _storage_client = AsyncStorageClient(f"{SUPABASE_URL}/storage/v1",
+                                             {'apiKey': SUPABASE_KEY, 'Authorization': f'Bearer {SUPABASE_KEY}'})
+        print(f" * Async storage client initialized (Bucket: {SUPABASE_BUCKET})")
+    return _storage_client
+
+def _header(scope, name):
+    for key, value in scope['headers']:
+        if key == name:
+            return value.decode('latin-1')
+    return None
+
+async def _send_response(send, status, headers, body=b''):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(k.encode('latin-1'), v.encode('latin-1')) for k, v in headers]})
+    await send({'type': 'http.response.body', 'body': body})
+
+def _read_cached(filename):
+    cached = get_upload_cache().get(filename)
+    if cached:
+        path, etag = cached
+        try:
+            with open(path, 'rb') as f:
+                return f.read(), etag
+        except OSError:
+            pass  # evicted between lookup and read
+    return None, None
+
+async def serve_bucket_object(scope, send, filename):
+    """Async counterpart of index.serve_upload's Supabase proxy; False if the Flask route should answer"""
+    started = time.perf_counter()
+    phases = {}
+    data, etag = await to_thread.run_sync(_read_cached, filename)
+    if data is None:
+        fetch_started = time.perf_counter()
+        try:
+            data = await get_async_storage().from_(SUPABASE_BUCKET).download(filename)
+        except Exception as e:
+            print(f" * Async proxy error for {filename}: {e}")
+            return False  # the Flask route retries and falls back to the local folder
+        finally:
+            phases['storage'] = time.perf_counter() - fetch_started
+        if not data:
+            return False
+        try:
+            _, etag = await to_thread.run_sync(get_upload_cache().put, filename, data)
+        except OSError as e:
+            print(f" * Upload cache write failed for {filename}: {e}")
+            etag = hashlib.sha256(data).hexdigest()[:32]
+
+    headers = [
+        ('Access-Control-Allow-Origin', '*'),
+        ('Cache-Control', UPLOAD_CACHE_CONTROL),
+        ('ETag', f'"{etag}"'),
+    ]
+    if parse_etags(_header(scope, b'if-none-match')).contains_weak(etag):
+        status, body = 304, b''
+    else:
+        mime_type, _ = mimetypes.guess_type(filename)
+        headers += [('Content-Type', mime_type or 'image/png'), ('Content-Length', str(len(data)))]
+        status, body = 200, (data if scope['method'] == 'GET' else b'')
+    total = time.perf_counter() - started
+    headers.append(('Server-Timing', metrics.server_timing(total, 0, phases)))
+    await _send_response(send, status, headers, body)
+    request_metrics.record('serve_upload', scope['method'], status, total, 0, phases)
+    return True
+
+def _environ(scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        # WSGI carries the decoded path as latin-1 code points of its UTF-8 bytes
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for key, value in scope['headers']:
+        name = key.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            environ[name] = value
+            continue
+        name = f'HTTP_{name}'
+        environ[name] = f'{environ[name]},{value}' if name in environ else value
+    return environ
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+def _run_flask(environ, send):
+    """Run the WSGI app on a worker thread, streaming its response back through the event loop"""
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+        return lambda data: None  # write() is not used by Flask
+
+    result = flask_app(environ, start_response)
+    try:
+        from_thread.run(send, {'type': 'http.response.start', 'status': response['status'],
+                               'headers': response['headers']})
+        for chunk in result:
+            if chunk:
+                from_thread.run(send, {'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        from_thread.run(send, {'type': 'http.response.body', 'body': b''})
+    finally:
+        close = getattr(result, 'close', None)
+        if close:
+            close()
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            if _storage_client is not None:
+                await _storage_client.aclose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def app(scope, receive, send):
+    global _flask_limiter
+    if scope['type'] == 'lifespan':
+        return await _lifespan(receive, send)
+    if scope['type'] != 'http':
+        return  # no websocket routes
+
+    path = scope['path']
+    if (scope['method'] in ('GET', 'HEAD') and path.startswith('/uploads/') and '/' in path[len('/uploads/'):]
+            and uploads.is_public(path[len('/uploads/'):]) and get_async_storage() is not None):
+        if await serve_bucket_object(scope, send, path[len('/uploads/'):]):
+            return
+
+    body = await _read_body(receive)
+    if body is None:
+        return  # client went away before sending the whole request
+    if _flask_limiter is None:
+        _flask_limiter = anyio.CapacityLimiter(ASGI_THREADS)
+    await to_thread.run_sync(_run_flask, _environ(scope, body), send, limiter=_flask_limiter)
@@ -0,0 +1,262 @@
+"""Concurrency benchmark: WSGI thread pool vs the ASGI entry point under slow storage.
+
+Starts a stand-in for Supabase Storage that answers every object download after
+--storage-delay ms, then serves the app twice in a child process:
+
+- wsgi: the Flask app on a werkzeug server with a fixed pool of --threads handler
+  threads (the shape of a gunicorn gthread worker)
+- asgi: asgi.app under uvicorn with ASGI_THREADS=--threads
+
+For each, checkout clients post /generate_bill on their own and then alongside
+--proxy-clients concurrent clients fetching uncached /uploads/<path> objects.
+Reports throughput and latency for both kinds of request.
+
+    pip install uvicorn
+    python bench_asgi.py [--proxy-clients 100] [--checkout-clients 4] [--threads 8]
+                         [--storage-delay 300] [--seconds 8]
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BASEDIR = os.path.dirname(os.path.abspath(__file__))
+BENCH_FOLDER = os.path.join(BASEDIR, 'instance', 'bench')
+ITEM_NAMES = ['Vanilla', 'Chocolate', 'Strawberry', 'Butterscotch', 'Mango']
+# 1x1 PNG served for every object
+PNG = bytes.fromhex('89504e470d0a1a0a0000000d4948445200000001000000010806000000'
+                    '1f15c4890000000d49444154789c6360000002000001e221bc330000000049454e44ae426082')
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Compare WSGI and ASGI serving under slow storage')
+    parser.add_argument('--proxy-clients', type=int, default=100, help='concurrent /uploads clients')
+    parser.add_argument('--checkout-clients', type=int, default=4, help='concurrent /generate_bill clients')
+    parser.add_argument('--threads', type=int, default=8, help='request threads in either server')
+    parser.add_argument('--storage-delay', type=float, default=300, help='storage response time in ms')
+    parser.add_argument('--seconds', type=float, default=8, help='duration of each phase')
+    parser.add_argument('--modes', default='wsgi,asgi')
+    parser.add_argument('--serve', choices=['wsgi', 'asgi'], help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+ARGS = parse_args()
+
+# ---- child process: the app server -------------------------------------------------
+
+def serve():
+    import logging
+    from werkzeug.serving import BaseWSGIServer
+    from concurrent.futures import ThreadPoolExecutor
+    from index import app, run_migrations
+
+    # Every proxied object is new, so the cache only has to exist, not to survive
+    cache_folder = os.path.join(BENCH_FOLDER, 'upload_cache')
+    shutil.rmtree(cache_folder, ignore_errors=True)
+    app.config['UPLOAD_CACHE_FOLDER'] = cache_folder
+    with app.app_context():
+        run_migrations()
+
+    if ARGS.serve == 'asgi':
+        import uvicorn
+        import asgi
+        uvicorn.run(asgi.app, host='127.0.0.1', port=ARGS.port, log_level='warning', backlog=2048)
+        return
+
+    class PooledWSGIServer(BaseWSGIServer):
+        request_queue_size = 2048
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.pool = ThreadPoolExecutor(ARGS.threads)
+
+        def process_request(self, request, client_address):
+            self.pool.submit(self._handle, request, client_address)
+
+        def _handle(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)  # no per-request access log
+    PooledWSGIServer('127.0.0.1', ARGS.port, app).serve_forever()
+
+# ---- parent process: storage stand-in and clients ---------------------------------
+
+class StorageHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        time.sleep(ARGS.storage_delay / 1000)
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(len(PNG)))
+        self.end_headers()
+        self.wfile.write(PNG)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.rfile.read(length)
+        body = b'{"Key": "ok"}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def start_storage():
+    ThreadingHTTPServer.request_queue_size = 2048
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StorageHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def start_app(mode, storage_port):
+    port = free_port()
+    env = dict(os.environ,
+               BILLING_DB_URI='sqlite:///' + os.path.join(BENCH_FOLDER, f'bench-asgi-{mode}.db'),
+               SUPABASE_URL=f'http://127.0.0.1:{storage_port}', SUPABASE_KEY='bench.bench.bench',
+               JOB_WORKERS='0', BILL_POST_JOBS='0', ASGI_THREADS=str(ARGS.threads))
+    child = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', mode, '--port', str(port),
+                              '--threads', str(ARGS.threads)], env=env, cwd=BASEDIR)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return child, port
+        except OSError:
+            if child.poll() is not None:
+                raise SystemExit(f"{mode} server exited with {child.returncode}")
+            time.sleep(0.2)
+    child.kill()
+    raise SystemExit(f"{mode} server did not start")
+
+def request(port, method, path, body=None, cookie=None):
+    headers = {'Connection': 'close'}
+    data = None
+    if body is not None:
+        data = body if isinstance(body, str) else json.dumps(body)
+        headers['Content-Type'] = 'application/json' if not isinstance(body, str) \
+            else 'application/x-www-form-urlencoded'
+    if cookie:
+        headers['Cookie'] = cookie
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+    try:
+        connection.request(method, path, body=data, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        return response.status, response.getheader('Set-Cookie')
+    finally:
+        connection.close()
+
+def login(port):
+    _, cookie = request(port, 'POST', '/login', 'username=admin&password=admin123')
+    return cookie.split(';', 1)[0]
+
+def bill_payload(rng):
+    items = []
+    for _ in range(rng.randint(1, 5)):
+        quantity = rng.randint(1, 10)
+        items.append({'name': rng.choice(ITEM_NAMES), 'quantity': quantity, 'price': 30, 'total': quantity * 30})
+    total = sum(item['total'] for item in items)
+    return {'items': items, 'grand_total': total, 'balance_amount': total, 'party_number': 'BENCH'}
+
+def run_clients(port, checkout_clients, proxy_clients, seconds):
+    results = {'checkout': [], 'proxy': []}
+    errors = {'checkout': 0, 'proxy': 0}
+    lock = threading.Lock()
+    cookies = [login(port) for _ in range(checkout_clients)]
+    deadline = time.perf_counter() + seconds
+
+    def loop(kind, index):
+        rng = random.Random(index)
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            try:
+                if kind == 'checkout':
+                    status, _ = request(port, 'POST', '/generate_bill', bill_payload(rng), cookies[index])
+                else:
+                    status, _ = request(port, 'GET', f'/uploads/bench/{uuid.uuid4().hex}.png')
+            except OSError:
+                status = 599
+            elapsed = time.perf_counter() - t0
+            with lock:
+                results[kind].append(elapsed)
+                errors[kind] += status >= 400
+
+    threads = [threading.Thread(target=loop, args=('checkout', i)) for i in range(checkout_clients)]
+    threads += [threading.Thread(target=loop, args=('proxy', i)) for i in range(proxy_clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    return {kind: summarize(samples, errors[kind], wall) for kind, samples in results.items() if samples}
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def summarize(samples, errors, wall):
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'rps': round(len(samples) / wall, 1),
+        'p50_ms': round(percentile(samples, 50) * 1000, 1),
+        'p95_ms': round(percentile(samples, 95) * 1000, 1),
+        'p99_ms': round(percentile(samples, 99) * 1000, 1)
+    }
+
+def main():
+    os.makedirs(BENCH_FOLDER, exist_ok=True)
+    storage = start_storage()
+    print(f"Storage stand-in on port {storage.server_port} ({ARGS.storage_delay:.0f} ms per object); "
+          f"{ARGS.threads} request threads; {ARGS.seconds:.0f}s per phase")
+    rows = []
+    for mode in ARGS.modes.split(','):
+        for filename in (f'bench-asgi-{mode}.db',):
+            path = os.path.join(BENCH_FOLDER, filename)
+            if os.path.exists(path):
+                os.remove(path)
+        child, port = start_app(mode, storage.server_port)
+        try:
+            request(port, 'GET', '/login')  # warm up
+            idle = run_clients(port, ARGS.checkout_clients, 0, ARGS.seconds)
+            loaded = run_clients(port, ARGS.checkout_clients, ARGS.proxy_clients, ARGS.seconds)
+        finally:
+            child.terminate()
+            child.wait()
+        rows.append((mode, 'checkout alone', idle['checkout']))
+        rows.append((mode, f'checkout + {ARGS.proxy_clients} proxies', loaded['checkout']))
+        rows.append((mode, 'proxies', loaded['proxy']))
+    storage.shutdown()
+
+    print(f"\n{'mode':<6} {'requests':<24} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for mode, label, r in rows:
+        print(f"{mode:<6} {label:<24} {r['rps']:>8} {r['p50_ms']:>9} {r['p95_ms']:>9} {r['p99_ms']:>9} {r['errors']:>7}")
+
+if __name__ == '__main__':
+    if ARGS.serve:
+        serve()
+    else:
+        main()
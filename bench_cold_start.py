@@ -0,0 +1,85 @@
+"""Cold-start benchmark: fresh interpreter -> `import index` -> first 200 response.
+
+Each run spawns a new Python process with `-X importtime`, so it pays the same
+import and first-request costs as a serverless cold start. Reports the median
+timings and the slowest top-level imports from the importtime breakdown.
+
+    python bench_cold_start.py [runs] [path]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+RUNS = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+FIRST_PATH = sys.argv[2] if len(sys.argv) > 2 else '/login'
+
+CHILD = r"""
+import sys, time, json
+t0 = time.perf_counter()
+import index
+t1 = time.perf_counter()
+client = index.app.test_client()
+response = client.get(sys.argv[1])
+t2 = time.perf_counter()
+response2 = client.get(sys.argv[1])
+t3 = time.perf_counter()
+print(json.dumps({'import': t1 - t0, 'first_response': t2 - t1, 'warm_response': t3 - t2,
+                  'status': response.status_code}))
+"""
+
+def parse_importtime(stderr):
+    """Modules at the top two import levels with their cumulative import time (us)"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, raw_name = line[len('import time:'):].split('|', 2)
+        depth = (len(raw_name) - len(raw_name.lstrip()) - 1) // 2
+        if depth <= 1:
+            modules[raw_name.strip()] = int(cumulative_us)
+    return modules
+
+def run_once():
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', CHILD, FIRST_PATH],
+        cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True
+    )
+    timings = None
+    for line in result.stdout.splitlines():
+        if line.startswith('{'):
+            timings = json.loads(line)
+    if timings is None:
+        raise RuntimeError(f"Benchmark child failed:\n{result.stdout}\n{result.stderr[-2000:]}")
+    return timings, parse_importtime(result.stderr)
+
+def benchmark():
+    print(f"--- Cold start: {RUNS} runs, first request GET {FIRST_PATH} ---")
+    run_once()  # warm the OS file cache, .pyc files and the Jinja bytecode cache
+    samples = []
+    module_totals = {}
+    for _ in range(RUNS):
+        timings, modules = run_once()
+        if timings['status'] != 200:
+            print(f"WARNING: first response returned {timings['status']}")
+        samples.append(timings)
+        for name, us in modules.items():
+            module_totals.setdefault(name, []).append(us)
+
+    def median_ms(key):
+        return statistics.median(s[key] for s in samples) * 1000
+
+    import_ms = median_ms('import')
+    first_ms = median_ms('first_response')
+    print(f"import index:           {import_ms:8.1f} ms")
+    print(f"first response:         {first_ms:8.1f} ms")
+    print(f"import -> first 200:    {import_ms + first_ms:8.1f} ms")
+    print(f"warm response:          {median_ms('warm_response'):8.1f} ms")
+    print("\nSlowest imports (median cumulative, -X importtime):")
+    ranked = sorted(((statistics.median(v), k) for k, v in module_totals.items()), reverse=True)
+    for us, name in ranked[:15]:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,159 @@
+"""Login burst benchmark: checkout latency while many logins are being verified.
+
+Serves the app in a child process (threaded werkzeug server) and measures
+/generate_bill on its own and alongside --login-clients concurrent logins, with
+password hashes either inline on the request threads (as before the hashing pool)
+or in the low-priority hashing pool. Throttling is relaxed so every login is hashed.
+
+    python bench_login.py [--login-clients 16] [--checkout-clients 4] [--seconds 6]
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+BASEDIR = os.path.dirname(os.path.abspath(__file__))
+BENCH_FOLDER = os.path.join(BASEDIR, 'instance', 'bench')
+MODES = {
+    'inline': {'PASSWORD_HASH_WORKERS': '0', 'PASSWORD_HASH_MAX_PENDING': '1000'},
+    'pool': {},
+}
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Checkout latency during a login burst')
+    parser.add_argument('--login-clients', type=int, default=16)
+    parser.add_argument('--checkout-clients', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=6)
+    parser.add_argument('--modes', default='inline,pool')
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+ARGS = parse_args()
+
+def serve():
+    import logging
+    from werkzeug.serving import make_server
+    from index import app, run_migrations
+    with app.app_context():
+        run_migrations()
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)  # no per-request access log
+    server = make_server('127.0.0.1', ARGS.port, app, threaded=True)
+    server.socket.listen(1024)
+    server.serve_forever()
+
+def start_app(mode):
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    db_path = os.path.join(BENCH_FOLDER, f'bench-login-{mode}.db')
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    env = dict(os.environ, BILLING_DB_URI='sqlite:///' + db_path, JOB_WORKERS='0', BILL_POST_JOBS='0',
+               LOGIN_FAILURES_PER_IP='1000000', LOGIN_FAILURES_PER_USER='1000000', **MODES[mode])
+    child = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', '--port', str(port)],
+                             env=env, cwd=BASEDIR)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return child, port
+        except OSError:
+            if child.poll() is not None:
+                raise SystemExit(f"{mode} server exited with {child.returncode}")
+            time.sleep(0.2)
+    child.kill()
+    raise SystemExit(f"{mode} server did not start")
+
+def request(port, method, path, body=None, form=None, cookie=None):
+    headers = {}
+    data = None
+    if body is not None:
+        data = json.dumps(body)
+        headers['Content-Type'] = 'application/json'
+    elif form is not None:
+        data = form
+        headers['Content-Type'] = 'application/x-www-form-urlencoded'
+    if cookie:
+        headers['Cookie'] = cookie
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+    try:
+        connection.request(method, path, body=data, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        return response.status, response.getheader('Set-Cookie')
+    finally:
+        connection.close()
+
+def login(port):
+    return request(port, 'POST', '/login', form='username=admin&password=admin123')
+
+def run(port, login_clients):
+    samples = {'checkout': [], 'login': []}
+    lock = threading.Lock()
+    cookies = [login(port)[1].split(';', 1)[0] for _ in range(ARGS.checkout_clients)]
+    deadline = time.perf_counter() + ARGS.seconds
+
+    def loop(kind, index):
+        rng = random.Random(index)
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            if kind == 'checkout':
+                quantity = rng.randint(1, 10)
+                request(port, 'POST', '/generate_bill', cookie=cookies[index], body={
+                    'items': [{'name': 'Vanilla', 'quantity': quantity, 'price': 30, 'total': quantity * 30}],
+                    'grand_total': quantity * 30, 'party_number': 'BENCH'})
+            else:
+                login(port)
+            with lock:
+                samples[kind].append(time.perf_counter() - t0)
+
+    threads = [threading.Thread(target=loop, args=('checkout', i)) for i in range(ARGS.checkout_clients)]
+    threads += [threading.Thread(target=loop, args=('login', i)) for i in range(login_clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    return {kind: summarize(values, wall) for kind, values in samples.items() if values}
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def summarize(samples, wall):
+    return {'rps': round(len(samples) / wall, 1), 'p50_ms': round(percentile(samples, 50) * 1000, 1),
+            'p95_ms': round(percentile(samples, 95) * 1000, 1), 'p99_ms': round(percentile(samples, 99) * 1000, 1)}
+
+def main():
+    os.makedirs(BENCH_FOLDER, exist_ok=True)
+    rows = []
+    for mode in ARGS.modes.split(','):
+        child, port = start_app(mode)
+        try:
+            login(port)  # warm up (and start the hashing pool)
+            idle = run(port, 0)
+            burst = run(port, ARGS.login_clients)
+        finally:
+            child.terminate()
+            child.wait()
+        rows.append((mode, 'checkout alone', idle['checkout']))
+        rows.append((mode, f'checkout + {ARGS.login_clients} logins', burst['checkout']))
+        rows.append((mode, 'logins', burst['login']))
+
+    print(f"\n{'mode':<7} {'requests':<22} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for mode, label, r in rows:
+        print(f"{mode:<7} {label:<22} {r['rps']:>8} {r['p50_ms']:>9} {r['p95_ms']:>9} {r['p99_ms']:>9}")
+
+if __name__ == '__main__':
+    if ARGS.serve:
+        serve()
+    else:
+        main()
@@ -0,0 +1,294 @@
+"""Route benchmark: seeded database -> core routes, in-process and over real HTTP.
+
+Seeds a dedicated SQLite database (instance/bench/bench-<bills>.db, reused on later
+runs) with bills carrying 1-8 lines each, then drives /generate_bill, /, /history,
+/view_bill/<n> and /settings:
+
+- through the Flask test client, one request at a time (pure server-side cost)
+- through a threaded WSGI server with concurrent HTTP clients (--concurrency)
+
+Reports p50/p95/p99 latency, throughput and SQL statements per request for every
+route, and compares p95 and queries against a stored baseline.
+
+    python bench_routes.py [--bills 10000] [--requests 200] [--concurrency 8]
+                           [--skip-server] [--save-baseline] [--baseline bench_baseline.json]
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+BASEDIR = os.path.dirname(os.path.abspath(__file__))
+ROUTES = ['/generate_bill', '/', '/history', '/view_bill', '/settings']
+ITEM_NAMES = ['Vanilla', 'Chocolate', 'Strawberry', 'Butterscotch', 'Mango', 'Auto', 'Boy', 'Beeda']
+LOCATIONS = ['Chennai', 'Madurai', 'Salem', 'Trichy', 'Coimbatore', '']
+SEED_BATCH = 5000
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark core routes against a seeded database')
+    parser.add_argument('--bills', type=int, default=10000, help='bills to seed (10k-1M)')
+    parser.add_argument('--requests', type=int, default=200, help='requests per route and mode')
+    parser.add_argument('--concurrency', type=int, default=8, help='HTTP clients in server mode')
+    parser.add_argument('--skip-server', action='store_true', help='only run the in-process benchmark')
+    parser.add_argument('--baseline', default=os.path.join(BASEDIR, 'bench_baseline.json'))
+    parser.add_argument('--save-baseline', action='store_true', help='store this run as the new baseline')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed p95 slowdown before flagging')
+    return parser.parse_args()
+
+ARGS = parse_args()
+
+# Point the app at the benchmark database and keep background work out of the timings
+os.makedirs(os.path.join(BASEDIR, 'instance', 'bench'), exist_ok=True)
+BENCH_DB = os.path.join(BASEDIR, 'instance', 'bench', f'bench-{ARGS.bills}.db')
+os.environ['BILLING_DB_URI'] = 'sqlite:///' + BENCH_DB
+os.environ['JOB_WORKERS'] = '0'
+os.environ['BILL_POST_JOBS'] = '0'
+
+from sqlalchemy import event, insert, func
+from sqlalchemy.engine import Engine
+from index import app, db, run_migrations, Bill, BillItem
+import reports
+import search
+
+# SQL statements per request, counted per thread so concurrent clients don't mix
+_query_counts = threading.local()
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    _query_counts.value = getattr(_query_counts, 'value', 0) + 1
+
+def seed(count):
+    """Insert `count` bills with 1-8 lines each unless the database already has them"""
+    with app.app_context():
+        run_migrations()
+        existing = db.session.query(func.count(Bill.id)).filter(Bill.bill_number.like('SEED-%')).scalar()
+        if existing >= count:
+            print(f"Using seeded database {BENCH_DB} ({existing} bills)")
+            return
+        print(f"Seeding {count - existing} bills into {BENCH_DB} ...")
+        rng = random.Random(42)
+        start = datetime(2024, 1, 1)
+        started = time.perf_counter()
+        for batch_start in range(existing, count, SEED_BATCH):
+            bills = []
+            lines = []
+            for i in range(batch_start, min(batch_start + SEED_BATCH, count)):
+                bill_lines = []
+                for _ in range(rng.randint(1, 8)):
+                    quantity = rng.randint(1, 20)
+                    price = rng.choice([20.0, 30.0, 45.0, 60.0, 100.0])
+                    bill_lines.append({'item_name': rng.choice(ITEM_NAMES), 'quantity': quantity, 'unit_price': price,
+                                       'total_price': quantity * price, 'item_description': rng.choice([None, 'cone', 'cup'])})
+                total = sum(line['total_price'] for line in bill_lines)
+                bills.append({
+                    'id': i + 1, 'bill_number': f'SEED-{i + 1:07d}',
+                    'date': start + timedelta(minutes=i * 7 % (900 * 24 * 60), seconds=i % 60),
+                    'company_name': 'ice Berg', 'shop_name': 'Bench Shop', 'location': rng.choice(LOCATIONS),
+                    'grand_total': total, 'advance_amount': 0.0, 'discount_amount': 0.0, 'balance_amount': total,
+                    'party_number': f'Party {rng.randint(1, 5000)}'
+                })
+                for line in bill_lines:
+                    line['bill_id'] = i + 1
+                lines.extend(bill_lines)
+            db.session.execute(insert(Bill), bills)
+            db.session.execute(insert(BillItem), lines)
+            db.session.commit()
+            print(f"  {min(batch_start + SEED_BATCH, count)}/{count} bills")
+        print("Rebuilding the sales summary and search index ...")
+        reports.rebuild_sales_summary()
+        search.rebuild_search_index()
+        db.session.commit()
+        print(f"Seeded in {time.perf_counter() - started:.1f}s")
+
+def bill_payload(rng):
+    items = []
+    for _ in range(rng.randint(1, 8)):
+        quantity = rng.randint(1, 10)
+        items.append({'name': rng.choice(ITEM_NAMES), 'quantity': quantity, 'price': 30, 'total': quantity * 30})
+    total = sum(item['total'] for item in items)
+    return {'items': items, 'grand_total': total, 'balance_amount': total,
+            'party_number': 'BENCH', 'location': rng.choice(LOCATIONS)}
+
+def request_plan(route, rng, count):
+    """(method, path, json body) for each request of a route"""
+    plan = []
+    for _ in range(count):
+        if route == '/generate_bill':
+            plan.append(('POST', route, bill_payload(rng)))
+        elif route == '/view_bill':
+            plan.append(('GET', f'/view_bill/SEED-{rng.randint(1, ARGS.bills):07d}', None))
+        else:
+            plan.append(('GET', route, None))
+    return plan
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def summarize(latencies, queries, wall, errors):
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'rps': round(len(latencies) / wall, 1) if wall else None,
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None
+    }
+
+def bench_in_process():
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+    results = {}
+    for route in ROUTES:
+        plan = request_plan(route, random.Random(route), ARGS.requests)
+        for method, path, body in plan[:5]:  # warm caches and the Jinja bytecode cache
+            client.open(path, method=method, json=body)
+        latencies, queries, errors = [], [], 0
+        started = time.perf_counter()
+        for method, path, body in plan:
+            _query_counts.value = 0
+            t0 = time.perf_counter()
+            response = client.open(path, method=method, json=body)
+            latencies.append(time.perf_counter() - t0)
+            queries.append(_query_counts.value)
+            errors += response.status_code >= 400
+        results[route] = summarize(latencies, queries, time.perf_counter() - started, errors)
+    return results
+
+class HttpClient:
+    """Keep-alive HTTP client holding the login cookie"""
+
+    def __init__(self, port):
+        self.port = port
+        self.connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        self.cookie = None
+        self.request('POST', '/login', form='username=admin&password=admin123')
+
+    def request(self, method, path, body=None, form=None):
+        headers = {}
+        data = None
+        if body is not None:
+            data = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        elif form is not None:
+            data = form
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        if self.cookie:
+            headers['Cookie'] = self.cookie
+        self.connection.request(method, path, body=data, headers=headers)
+        response = self.connection.getresponse()
+        response.read()
+        cookie = response.getheader('Set-Cookie')
+        if cookie:
+            self.cookie = cookie.split(';', 1)[0]
+        return response.status
+
+def bench_server():
+    import logging
+    from werkzeug.serving import make_server
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)  # no per-request access log
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    port = server.server_port
+    results = {}
+    try:
+        clients = [HttpClient(port) for _ in range(ARGS.concurrency)]
+        for route in ROUTES:
+            plan = request_plan(route, random.Random(route), ARGS.requests)
+            latencies, errors = [], [0]
+            lock = threading.Lock()
+            queries_before = _server_queries()
+
+            def worker(index):
+                client = clients[index]
+                for method, path, body in plan[index::ARGS.concurrency]:
+                    t0 = time.perf_counter()
+                    status = client.request(method, path, body)
+                    elapsed = time.perf_counter() - t0
+                    with lock:
+                        latencies.append(elapsed)
+                        errors[0] += status >= 400
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(ARGS.concurrency) as pool:
+                list(pool.map(worker, range(ARGS.concurrency)))
+            wall = time.perf_counter() - started
+            total_queries = _server_queries() - queries_before
+            result = summarize(latencies, [], wall, errors[0])
+            result['queries_per_request'] = round(total_queries / len(latencies), 2)
+            results[route] = result
+    finally:
+        server.shutdown()
+    return results
+
+# Server-mode queries are counted across all handler threads
+_server_query_total = [0]
+_server_lock = threading.Lock()
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_server_query(conn, cursor, statement, parameters, context, executemany):
+    with _server_lock:
+        _server_query_total[0] += 1
+
+def _server_queries():
+    with _server_lock:
+        return _server_query_total[0]
+
+def print_results(mode, results, baseline):
+    print(f"\n--- {mode} ({ARGS.bills} bills, {ARGS.requests} requests/route"
+          f"{'' if mode == 'in-process' else f', {ARGS.concurrency} clients'}) ---")
+    print(f"{'route':<15} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'queries':>8} {'errors':>6}  vs baseline")
+    regressions = []
+    for route, r in results.items():
+        base = baseline.get(mode, {}).get(route)
+        note = ''
+        if base:
+            change = (r['p95_ms'] - base['p95_ms']) / base['p95_ms'] if base['p95_ms'] else 0
+            note = f"p95 {change:+.0%}"
+            if base.get('queries_per_request') is not None and r['queries_per_request'] != base['queries_per_request']:
+                note += f", queries {base['queries_per_request']} -> {r['queries_per_request']}"
+            if change > ARGS.threshold or (r['queries_per_request'] or 0) > (base.get('queries_per_request') or 0):
+                note += '  REGRESSION'
+                regressions.append(f"{mode} {route}")
+        print(f"{route:<15} {r['p50_ms']:>8} {r['p95_ms']:>8} {r['p99_ms']:>8} {r['rps']:>8} "
+              f"{r['queries_per_request']:>8} {r['errors']:>6}  {note}")
+    return regressions
+
+def main():
+    seed(ARGS.bills)
+    baseline = {}
+    if os.path.exists(ARGS.baseline):
+        with open(ARGS.baseline) as f:
+            stored = json.load(f)
+        if stored.get('bills') == ARGS.bills:
+            baseline = stored.get('results', {})
+        else:
+            print(f"Baseline was recorded with {stored.get('bills')} bills; not comparing")
+
+    results = {'in-process': bench_in_process()}
+    if not ARGS.skip_server:
+        results['server'] = bench_server()
+
+    regressions = []
+    for mode, mode_results in results.items():
+        regressions += print_results(mode, mode_results, baseline)
+
+    if ARGS.save_baseline:
+        with open(ARGS.baseline, 'w') as f:
+            json.dump({'bills': ARGS.bills, 'recorded_at': datetime.now().isoformat(timespec='seconds'),
+                       'results': results}, f, indent=2)
+        print(f"\nSaved baseline to {ARGS.baseline}")
+    if regressions:
+        print(f"\nRegressions: {', '.join(regressions)}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
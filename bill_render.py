@@ -0,0 +1,153 @@
+"""Server-side rendering of a Bill and its BillItems to PNG/PDF (Pillow only, no browser)."""
+import io
+import os
+from PIL import Image, ImageDraw, ImageFont
+
+PAGE_WIDTH = 800
+MARGIN = 40
+FOOTER_IMAGE_SIZE = 150
+
+FONT_PATHS = {
+    False: ['/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf', 'DejaVuSans.ttf', 'arial.ttf'],
+    True: ['/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf', 'DejaVuSans-Bold.ttf', 'arialbd.ttf'],
+}
+
+_fonts = {}
+
+def get_font(size, bold=False):
+    key = (size, bold)
+    if key not in _fonts:
+        font = None
+        for path in FONT_PATHS[bold]:
+            try:
+                font = ImageFont.truetype(path, size)
+                break
+            except OSError:
+                continue
+        _fonts[key] = font or ImageFont.load_default(size)
+    return _fonts[key]
+
+def format_amount(value):
+    return f"Rs. {value or 0:.2f}"
+
+class _Canvas:
+    """Top-to-bottom layout helper; draws onto a tall page that is cropped at the end."""
+
+    def __init__(self, max_height):
+        self.image = Image.new('RGB', (PAGE_WIDTH, max_height), 'white')
+        self.draw = ImageDraw.Draw(self.image)
+        self.y = MARGIN
+
+    def text(self, value, size=18, bold=False, align='left', color='black', x=None, advance=True):
+        font = get_font(size, bold)
+        left, top, right, bottom = self.draw.textbbox((0, 0), value, font=font)
+        width = right - left
+        if x is None:
+            if align == 'center':
+                x = (PAGE_WIDTH - width) // 2
+            elif align == 'right':
+                x = PAGE_WIDTH - MARGIN - width
+            else:
+                x = MARGIN
+        elif align == 'right':
+            x = x - width
+        self.draw.text((x, self.y), value, font=font, fill=color)
+        if advance:
+            self.y += bottom + size // 3
+
+    def rule(self, dashed=False, width=1, gap=10):
+        self.y += gap // 2
+        if dashed:
+            for x in range(MARGIN, PAGE_WIDTH - MARGIN, 12):
+                self.draw.line((x, self.y, x + 6, self.y), fill='#999999', width=width)
+        else:
+            self.draw.line((MARGIN, self.y, PAGE_WIDTH - MARGIN, self.y), fill='#333333', width=width)
+        self.y += gap
+
+    def total_row(self, label, value, size=20, color='black'):
+        self.text(label, size=size, bold=True, x=PAGE_WIDTH - MARGIN - 170, align='right', color=color, advance=False)
+        self.text(format_amount(value), size=size, bold=True, align='right', color=color)
+
+    def cropped(self):
+        return self.image.crop((0, 0, PAGE_WIDTH, self.y + MARGIN))
+
+def render_bill_image(bill, footer_image_path=None):
+    """Lay out the bill the same way bill_view.html does and return a PIL image"""
+    items = list(bill.items)
+    canvas = _Canvas(max_height=1400 + 90 * len(items))
+
+    # Header
+    canvas.text(bill.company_name or '', size=44, bold=True, align='center', color='#d63031')
+    canvas.text(bill.shop_name or '', size=26, bold=True, align='center', color='#0c09d0')
+    if bill.shop_address:
+        canvas.text(bill.shop_address, size=18, align='center')
+    mobiles = bill.shop_mobile or ''
+    if bill.shop_mobile2:
+        mobiles += ', ' + bill.shop_mobile2
+    canvas.text(f"Mobile: {mobiles}", size=16, align='center')
+    canvas.rule(gap=12)
+    canvas.text('ESTIMATE', size=14, bold=True, align='center')
+    if bill.location:
+        canvas.text(bill.location, size=22, bold=True, align='center')
+
+    # Bill info
+    canvas.y += 10
+    canvas.text(f"Date: {bill.date.strftime('%d/%m/%Y %I:%M %p')}", size=20)
+    if bill.party_number:
+        canvas.text(f"Party Number: {bill.party_number}", size=20)
+    canvas.rule(dashed=True, gap=16)
+
+    # Items
+    qty_x = PAGE_WIDTH - MARGIN - 230
+    canvas.text('Item Name', size=20, bold=True, advance=False)
+    canvas.text('Qty', size=20, bold=True, x=qty_x, advance=False)
+    canvas.text('Total', size=20, bold=True, align='right')
+    canvas.rule(gap=8)
+    for item in items:
+        show_qty = item.item_name.lower() not in ['auto', 'boy']
+        canvas.text(item.item_name, size=18, bold=True, advance=False)
+        if show_qty:
+            canvas.text(str(item.quantity), size=18, bold=True, x=qty_x, advance=False)
+        canvas.text(f"{item.total_price:.2f}", size=18, bold=True, align='right')
+        if item.item_description:
+            canvas.text(item.item_description, size=16, bold=True)
+        canvas.y += 6
+    canvas.rule(width=2, gap=12)
+
+    # Totals
+    canvas.total_row('Total Amount:', bill.grand_total)
+    if (bill.advance_amount or 0) > 0:
+        canvas.total_row('Advance Paid:', bill.advance_amount, color='#c62828')
+    if (bill.discount_amount or 0) > 0:
+        canvas.total_row('Discount:', bill.discount_amount, size=18, color='#636e72')
+    if (bill.advance_amount or 0) > 0 or (bill.discount_amount or 0) > 0:
+        canvas.rule(width=2, gap=8)
+        canvas.total_row('Balance:', bill.balance_amount, size=24)
+
+    # Payment QR / footer image
+    if footer_image_path and os.path.exists(footer_image_path):
+        try:
+            with Image.open(footer_image_path) as footer:
+                footer = footer.convert('RGB')
+                footer.thumbnail((FOOTER_IMAGE_SIZE, FOOTER_IMAGE_SIZE))
+                canvas.y += 20
+                canvas.text('Payment QR', size=14, bold=True, align='center')
+                canvas.image.paste(footer, ((PAGE_WIDTH - footer.width) // 2, canvas.y))
+                canvas.y += footer.height + 20
+        except OSError:
+            pass
+
+    canvas.y += 20
+    canvas.text('Thank you for your business!', size=14, align='center', color='#666666')
+    canvas.text('This is a computer-generated soft copy of the bill.', size=14, align='center', color='#666666')
+    return canvas.cropped()
+
+def render_bill(bill, fmt, footer_image_path=None):
+    """Render a bill to 'png' or 'pdf' bytes"""
+    image = render_bill_image(bill, footer_image_path)
+    buffer = io.BytesIO()
+    if fmt == 'pdf':
+        image.save(buffer, 'PDF', resolution=100.0)
+    else:
+        image.save(buffer, 'PNG', optimize=True)
+    return buffer.getvalue()
@@ -0,0 +1,129 @@
+"""Item catalog bulk operations: price edits, paging, import and export.
+
+Price edits from the settings page touch only the rows whose price actually
+changed, in one UPDATE. Imports upsert by item name in batches inside the
+caller's transaction, so a file of thousands of items is applied all or nothing.
+"""
+import csv
+import io
+import json
+from sqlalchemy import select, update, case, func
+from models import db, Item
+
+CATALOG_COLUMNS = ('name', 'price', 'category', 'is_flavor', 'description')
+IMPORT_BATCH_ROWS = 500
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'on'}
+# Column sizes in models.Item; checked up front so one long value can't abort the whole import
+MAX_LENGTHS = {'name': 100, 'category': 50, 'description': 500}
+
+def item_page(q='', page=1, per_page=50):
+    """(items, has_next) for one page of the catalog, optionally filtered by name"""
+    query = Item.query
+    if q:
+        query = query.filter(Item.name.ilike(f'%{q}%'))
+    items = query.order_by(Item.category, Item.is_flavor, Item.name, Item.id) \
+        .offset((page - 1) * per_page).limit(per_page + 1).all()
+    return items[:per_page], len(items) > per_page
+
+def apply_price_changes(submitted):
+    """Set {item_id: price} for the items whose price differs; returns how many changed"""
+    if not submitted:
+        return 0
+    current = dict(db.session.execute(select(Item.id, Item.price).where(Item.id.in_(list(submitted)))).all())
+    changes = {item_id: price for item_id, price in submitted.items()
+               if item_id in current and current[item_id] != price}
+    if changes:
+        db.session.execute(
+            update(Item).where(Item.id.in_(list(changes))).values(price=case(changes, value=Item.id)),
+            execution_options={'synchronize_session': False}
+        )
+    return len(changes)
+
+def _parse_row(raw, line):
+    name = str(raw.get('name') or '').strip()
+    if not name:
+        raise ValueError(f"Row {line}: name is required")
+    row = {'name': name}
+    if 'price' in raw:
+        try:
+            row['price'] = float(raw['price'] or 0)
+        except (TypeError, ValueError):
+            raise ValueError(f"Row {line}: invalid price {raw['price']!r}")
+    if 'category' in raw:
+        row['category'] = str(raw['category'] or '').strip() or 'Main'
+    if 'is_flavor' in raw:
+        value = raw['is_flavor']
+        row['is_flavor'] = value if isinstance(value, bool) else str(value or '').strip().lower() in TRUE_VALUES
+    if 'description' in raw:
+        row['description'] = str(raw['description']).strip() if raw['description'] is not None else None
+    for field, limit in MAX_LENGTHS.items():
+        if row.get(field) and len(row[field]) > limit:
+            raise ValueError(f"Row {line}: {field} is longer than {limit} characters")
+    return row
+
+def parse_catalog(data, fmt):
+    """Item rows from CSV text or a JSON list (or {"items": [...]}); raises ValueError"""
+    if fmt == 'csv':
+        raw_rows = list(csv.DictReader(io.StringIO(data)))
+    else:
+        try:
+            parsed = json.loads(data)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON: {e}")
+        raw_rows = parsed.get('items') if isinstance(parsed, dict) else parsed
+        if not isinstance(raw_rows, list) or not all(isinstance(r, dict) for r in raw_rows):
+            raise ValueError('Expected a list of item objects')
+    # Keyed by name so a name repeated in the file resolves to its last row
+    rows = {}
+    for line, raw in enumerate(raw_rows, start=2 if fmt == 'csv' else 1):
+        raw = {k.strip().lower(): v for k, v in raw.items() if k}
+        if fmt == 'csv':
+            # CSV can't tell an empty cell from a column left out, so a blank cell keeps the item's current value
+            raw = {k: v for k, v in raw.items() if v is not None and v.strip()}
+        row = _parse_row(raw, line)
+        rows[row['name']] = row
+    return list(rows.values())
+
+def _upsert_statement(columns):
+    table = Item.__table__
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    stmt = dialect_insert(table)
+    # Only the columns the rows carry are overwritten on existing items
+    set_ = {name: stmt.excluded[name] for name in columns if name != 'name'}
+    if not set_:
+        return stmt.on_conflict_do_nothing(index_elements=['name'])
+    return stmt.on_conflict_do_update(index_elements=['name'], set_=set_)
+
+def import_catalog(rows):
+    """Upsert item rows by name in the current transaction; returns (created, updated)"""
+    updated = 0
+    for start in range(0, len(rows), IMPORT_BATCH_ROWS):
+        batch = rows[start:start + IMPORT_BATCH_ROWS]
+        names = [row['name'] for row in batch]
+        updated += db.session.execute(select(func.count(Item.id)).where(Item.name.in_(names))).scalar()
+        # One upsert per set of columns rows carry, so an existing item only gets the fields its row has
+        by_columns = {}
+        for row in batch:
+            by_columns.setdefault(tuple(name for name in CATALOG_COLUMNS if name in row), []).append(row)
+        for columns, group in by_columns.items():
+            # New items need every column; fill the ones these rows leave out with the model defaults
+            values = [{'price': 0.0, 'category': 'Main', 'is_flavor': False, 'description': None, **row}
+                      for row in group]
+            db.session.execute(_upsert_statement(columns), values)
+    return len(rows) - updated, updated
+
+def catalog_csv():
+    """Yield the whole catalog as CSV, in the format import_catalog reads"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CATALOG_COLUMNS)
+    rows = db.session.execute(select(*(getattr(Item, name) for name in CATALOG_COLUMNS)).order_by(Item.id)).all()
+    writer.writerows(rows)
+    yield buffer.getvalue()
+
+def catalog_json():
+    rows = db.session.execute(select(*(getattr(Item, name) for name in CATALOG_COLUMNS)).order_by(Item.id)).all()
+    yield json.dumps({'items': [dict(zip(CATALOG_COLUMNS, row)) for row in rows]}, ensure_ascii=False)
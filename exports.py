@@ -0,0 +1,112 @@
+"""Streaming exports of bills and bill lines.
+
+Rows are fetched with `yield_per` (a server-side cursor on Postgres) and written
+out in chunks as they arrive, so memory stays flat however many bills match.
+Archived bills in the range (see archive.iter_archived_bills, one month's segment
+in memory at a time) are merged in by date, so an export covers archived periods too.
+"""
+import csv
+import heapq
+import io
+import json
+import zlib
+from datetime import datetime
+from sqlalchemy import select
+from models import db, Bill, BillItem
+
+EXPORT_BATCH_ROWS = 1000
+
+BILL_COLUMNS = ('bill_number', 'date', 'location', 'party_number', 'grand_total',
+                'advance_amount', 'discount_amount', 'balance_amount', 'company_name', 'shop_name')
+BILL_ITEM_COLUMNS = ('item_name', 'item_description', 'quantity', 'unit_price', 'total_price')
+
+def _filtered(statement, start=None, end=None, location=None):
+    if start is not None:
+        statement = statement.where(Bill.date >= start)
+    if end is not None:
+        statement = statement.where(Bill.date < end)
+    if location:
+        statement = statement.where(Bill.location.ilike(f'%{location}%'))
+    return statement
+
+def _partitions(statement):
+    result = db.session.execute(statement.execution_options(yield_per=EXPORT_BATCH_ROWS))
+    try:
+        yield from result.partitions()
+    finally:
+        result.close()
+
+def _live_rows(statement):
+    """(sort key, values) for rows selecting Bill.date and Bill.id ahead of the exported values"""
+    for rows in _partitions(statement):
+        for row in rows:
+            yield (row[0] or datetime.min, row[1]), row[2:]
+
+def _archived_rows(archived, location, values):
+    location = (location or '').lower()
+    for bill in archived:
+        if location and location not in (bill.location or '').lower():
+            continue
+        for row in values(bill):
+            yield (bill.date or datetime.min, bill.id), row
+
+def _merged_chunks(live, archived):
+    """Rows of both (already date-ordered) streams in date order, in lists of EXPORT_BATCH_ROWS"""
+    chunk = []
+    for _, row in heapq.merge(live, archived, key=lambda pair: pair[0]):
+        chunk.append(row)
+        if len(chunk) >= EXPORT_BATCH_ROWS:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _format_value(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S') if hasattr(value, 'strftime') else value
+
+def bills_csv(start=None, end=None, location=None, archived=()):
+    """Yield CSV text for bills in the range, oldest first, one chunk per batch of rows.
+
+    archived: archived bills in the range, oldest first (archive.iter_archived_bills).
+    """
+    statement = _filtered(
+        select(Bill.date, Bill.id, *(getattr(Bill, name) for name in BILL_COLUMNS)), start, end, location
+    ).order_by(Bill.date, Bill.id)
+    archived_rows = _archived_rows(archived, location, lambda bill: [tuple(getattr(bill, name) for name in BILL_COLUMNS)])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(BILL_COLUMNS)
+    for rows in _merged_chunks(_live_rows(statement), archived_rows):
+        writer.writerows([_format_value(v) for v in row] for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def bill_items_jsonl(start=None, end=None, location=None, archived=()):
+    """Yield JSON Lines for bill lines in the range, each tagged with its bill number and date"""
+    statement = _filtered(
+        select(Bill.date, Bill.id, Bill.bill_number, Bill.date, Bill.location,
+               *(getattr(BillItem, name) for name in BILL_ITEM_COLUMNS))
+        .join(Bill, BillItem.bill_id == Bill.id),
+        start, end, location
+    ).order_by(Bill.date, Bill.id, BillItem.id)
+    archived_rows = _archived_rows(archived, location, lambda bill: [
+        (bill.bill_number, bill.date, bill.location) + tuple(getattr(item, name) for name in BILL_ITEM_COLUMNS)
+        for item in bill.items
+    ])
+    columns = ('bill_number', 'bill_date', 'location') + BILL_ITEM_COLUMNS
+    for rows in _merged_chunks(_live_rows(statement), archived_rows):
+        yield ''.join(
+            json.dumps(dict(zip(columns, map(_format_value, row))), ensure_ascii=False) + '\n' for row in rows
+        )
+
+def gzip_stream(chunks, level=6):
+    """Compress a stream of text chunks into a single gzip member as it goes"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
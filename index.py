@@ -1,23 +1,43 @@
 import os
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_from_directory, session, make_response
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_from_directory, session, make_response, g, has_request_context, Response, stream_with_context, abort, before_render_template, template_rendered
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import generate_password_hash
 from werkzeug.utils import secure_filename
-from models import db, User, ShopSettings, Item, Bill, BillItem
+from models import db, User, ShopSettings, Item, Bill, BillItem, Job, SchemaVersion, ArchivedBill, ArchivedSalesSummary
+import jobs
+import reports
+import exports
+import catalog
+import search
+import pooling
+import archive
+import metrics
+import uploads
+import passwords
+from storage import LocalBucket, DiskLRUCache
 from datetime import datetime, timedelta, timezone
-import json
 import base64
+import hashlib
+import threading
+import time
 import mimetypes
 from types import SimpleNamespace
-from supabase import create_client, Client
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
+from functools import wraps
+from sqlalchemy import event, text, insert, bindparam
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
+from jinja2 import FileSystemBytecodeCache
 
 # Determine if we are running on Vercel or similar read-only environment
 IS_VERCEL = "VERCEL" in os.environ
 
+# Load environment variables from .env file (Vercel injects them directly,
+# so skip importing dotenv on serverless cold starts)
+if not IS_VERCEL:
+    from dotenv import load_dotenv
+    load_dotenv()
+
 
 def get_now():
     """Get current time in IST (UTC+5:30)"""
@@ -32,6 +52,8 @@ if IS_VERCEL:
     
     if db_uri.startswith("postgres://"):
         db_uri = db_uri.replace("postgres://", "postgresql://", 1)
+    # Decided before the query string is stripped: ?pgbouncer=true marks a pooler URL
+    db_pool_mode = pooling.detect_pool_mode(db_uri)
     
     # Clean problematic query parameters (like ?supa=... or others that psycopg2 dislikes)
     if "postgresql" in db_uri and "?" in db_uri:
@@ -42,15 +64,33 @@ if IS_VERCEL:
         db_uri = base_uri
         
     upload_folder = '/tmp/uploads'
+    bill_render_folder = '/tmp/bills'
+    local_bucket_folder = '/tmp/bucket'
+    upload_cache_folder = '/tmp/upload_cache'
+    bill_page_cache_folder = '/tmp/bill_page_cache'
+    jinja_cache_folder = '/tmp/jinja_cache'
     os.makedirs(upload_folder, exist_ok=True)
+    os.makedirs(bill_render_folder, exist_ok=True)
 else:
     app = Flask(__name__)
     basedir = os.path.abspath(os.path.dirname(__file__))
-    db_uri = 'sqlite:///' + os.path.join(basedir, 'instance', 'billing.db')
+    # BILLING_DB_URI points a local run at another database (e.g. the benchmark's seeded copy)
+    db_uri = os.environ.get('BILLING_DB_URI') or 'sqlite:///' + os.path.join(basedir, 'instance', 'billing.db')
+    db_pool_mode = pooling.detect_pool_mode(db_uri)
     upload_folder = os.path.join(basedir, 'static', 'uploads')
+    # Rendered bills are customer data: kept out of static/ and served by the login-only download route
+    bill_render_folder = os.path.join(basedir, 'instance', 'bills')
+    local_bucket_folder = os.path.join(basedir, 'instance', 'bucket')
+    upload_cache_folder = os.path.join(basedir, 'instance', 'upload_cache')
+    bill_page_cache_folder = os.path.join(basedir, 'instance', 'bill_page_cache')
+    jinja_cache_folder = os.path.join(basedir, 'instance', 'jinja_cache')
     # Ensure folders exist
-    os.makedirs(os.path.join(basedir, 'instance'), exist_ok=True)
     os.makedirs(upload_folder, exist_ok=True)
+    os.makedirs(bill_render_folder, exist_ok=True)
+
+# Compiled templates are cached on disk so a cold process skips Jinja compilation
+os.makedirs(jinja_cache_folder, exist_ok=True)
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(jinja_cache_folder)
 
 # Important for Vercel/Serverless
 application = app
@@ -61,33 +101,72 @@ SUPABASE_URL = os.environ.get("SUPABASE_URL")
 SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
 SUPABASE_BUCKET = os.environ.get("SUPABASE_BUCKET", "billing")
 
-# DEBUG: Print environment status (obfuscated)
-print(f" * DEBUG: SUPABASE_URL: {SUPABASE_URL[:15] if SUPABASE_URL else 'None'}...")
-print(f" * DEBUG: SUPABASE_KEY: {SUPABASE_KEY[:15] if SUPABASE_KEY else 'None'}...")
-print(f" * DEBUG: SUPABASE_BUCKET: {SUPABASE_BUCKET}")
+# DEBUG: Log environment status (obfuscated)
+app.logger.debug("SUPABASE_URL: %s...", SUPABASE_URL[:15] if SUPABASE_URL else 'None')
+app.logger.debug("SUPABASE_KEY: %s...", SUPABASE_KEY[:15] if SUPABASE_KEY else 'None')
+app.logger.debug("SUPABASE_BUCKET: %s", SUPABASE_BUCKET)
 
 _supabase_client = None
+_local_bucket = None
 def get_supabase():
     global _supabase_client
     if _supabase_client is None:
         if SUPABASE_URL and SUPABASE_KEY:
             try:
+                # Imported on first use: supabase and its HTTP stack dominate import time
+                from supabase import create_client
                 _supabase_client = create_client(SUPABASE_URL, SUPABASE_KEY)
                 print(f" * Supabase client initialized (Bucket: {SUPABASE_BUCKET})")
             except Exception as e:
                 print(f" * Error initializing Supabase client: {e}")
     return _supabase_client
 
+def get_storage_bucket():
+    """The Supabase bucket when configured, otherwise a local folder with the same API"""
+    global _local_bucket
+    client = get_supabase()
+    if client:
+        return client.storage.from_(SUPABASE_BUCKET)
+    if _local_bucket is None:
+        _local_bucket = LocalBucket(app.config['LOCAL_BUCKET_FOLDER'])
+    return _local_bucket
+
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key-here')
 app.config['SQLALCHEMY_DATABASE_URI'] = db_uri
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# NullPool behind a transaction pooler, a pre-pinged QueuePool for direct Postgres
+pool_metrics = pooling.PoolMetrics()
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = pooling.engine_options(db_uri, db_pool_mode, pool_metrics, serverless=IS_VERCEL)
 app.config['UPLOAD_FOLDER'] = upload_folder
+app.config['BILL_RENDER_FOLDER'] = bill_render_folder
+app.config['LOCAL_BUCKET_FOLDER'] = local_bucket_folder
+app.config['UPLOAD_CACHE_FOLDER'] = upload_cache_folder
+app.config['UPLOAD_CACHE_MAX_BYTES'] = int(os.environ.get('UPLOAD_CACHE_MAX_BYTES', 100 * 1024 * 1024))
+app.config['BILL_PAGE_CACHE_FOLDER'] = bill_page_cache_folder
+app.config['BILL_PAGE_CACHE_MAX_BYTES'] = int(os.environ.get('BILL_PAGE_CACHE_MAX_BYTES', 50 * 1024 * 1024))
+# Uploaded objects get unique (timestamped) names and are never rewritten in place
+UPLOAD_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Background jobs: in-process worker threads (none on serverless, where threads
+# don't outlive the response; run `python jobs.py` elsewhere instead) and whether
+# saving a bill queues its render/upload jobs
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 0 if IS_VERCEL else 2))
+app.config['BILL_POST_JOBS'] = os.environ.get('BILL_POST_JOBS', '0' if IS_VERCEL else '1') == '1'
 
 # Log database type (obfuscate password if present)
 db_log_uri = db_uri
 if '@' in db_log_uri:
     db_log_uri = db_log_uri.split('@')[1]
-print(f" * Using Database: {db_log_uri.split(':')[0]}...")
+app.logger.debug("Using Database: %s...", db_log_uri.split(':')[0])
+# Password hashes run in a small low-priority process pool (inline on serverless,
+# where worker processes aren't available), with a cap on hashes in flight
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', 0 if IS_VERCEL else 2))
+app.config['PASSWORD_HASH_MAX_PENDING'] = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 8))
+password_hasher = passwords.PasswordHasher(app.config['PASSWORD_HASH_WORKERS'], app.config['PASSWORD_HASH_MAX_PENDING'])
+login_throttle = passwords.LoginThrottle(
+    ip_failures=int(os.environ.get('LOGIN_FAILURES_PER_IP', 30)),
+    user_failures=int(os.environ.get('LOGIN_FAILURES_PER_USER', 5)),
+    window_seconds=int(os.environ.get('LOGIN_THROTTLE_WINDOW', 300))
+)
 app.config['ALLOWED_EXTENSIONS'] = {'png', 'jpg', 'jpeg', 'gif'}
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=31)
 
@@ -96,23 +175,163 @@ def allowed_file(filename):
            filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
 
 db.init_app(app)
+
+# Per-request SQL statement counter and timer, used for query budgets on read
+# paths and for the db phase in /metrics and Server-Timing
+@event.listens_for(Engine, 'before_cursor_execute')
+def count_request_queries(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.query_count = g.get('query_count', 0) + 1
+        conn.info.setdefault('request_query_started', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def time_request_queries(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('request_query_started')
+    if started:
+        metrics.add_phase_time('db', time.perf_counter() - started.pop())
+
+@event.listens_for(Engine, 'handle_error')
+def discard_failed_query_timer(exception_context):
+    connection = exception_context.connection
+    started = connection.info.get('request_query_started') if connection is not None else None
+    if started:
+        started.pop()
+
+def query_budget(max_queries):
+    """Cap the number of SQL statements a view (including its template render) may issue.
+
+    Exceeding the budget raises in TESTING so N+1 regressions fail the test run,
+    and only logs a warning in production.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            before = g.get('query_count', 0)
+            response = view(*args, **kwargs)
+            used = g.get('query_count', 0) - before
+            if used > max_queries:
+                message = f"{request.endpoint} issued {used} queries (budget {max_queries})"
+                if app.config.get('TESTING'):
+                    raise AssertionError(message)
+                print(f" * WARNING: Query budget exceeded: {message}")
+            return response
+        return wrapped
+    return decorator
+
+request_metrics = metrics.RequestMetrics()
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+@app.before_request
+def start_request_metrics():
+    metrics.start_request()
+
+@before_render_template.connect_via(app)
+def start_render_timer(sender, template, context, **extra):
+    if has_request_context():
+        g.render_started = time.perf_counter()
+
+@template_rendered.connect_via(app)
+def stop_render_timer(sender, template, context, **extra):
+    started = g.pop('render_started', None) if has_request_context() else None
+    if started is not None:
+        metrics.add_phase_time('render', time.perf_counter() - started)
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.get('request_started')
+    if started is None:
+        return response
+    total = time.perf_counter() - started
+    query_count = g.get('query_count', 0)
+    phases = g.get('phase_seconds', {})
+    request_metrics.record(request.endpoint or 'unmatched', request.method, response.status_code,
+                           total, query_count, phases)
+    response.headers['Server-Timing'] = metrics.server_timing(total, query_count, phases)
+    return response
+
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
+_upload_cache = None
+def get_upload_cache():
+    global _upload_cache
+    if _upload_cache is None:
+        _upload_cache = DiskLRUCache(app.config['UPLOAD_CACHE_FOLDER'], app.config['UPLOAD_CACHE_MAX_BYTES'])
+    return _upload_cache
+
+def read_cached_upload(filename):
+    """(bytes, etag) for a bucket object, from the local disk cache when possible"""
+    cache = get_upload_cache()
+    cached = cache.get(filename)
+    if cached:
+        path, etag = cached
+        try:
+            with open(path, 'rb') as f:
+                return f.read(), etag
+        except OSError:
+            pass  # evicted between lookup and read
+    with metrics.timed('storage'):
+        file_data = get_supabase().storage.from_(SUPABASE_BUCKET).download(filename)
+    if not file_data:
+        return None, None
+    try:
+        _, etag = cache.put(filename, file_data)
+    except OSError as e:
+        print(f" * Upload cache write failed for {filename}: {e}")
+        etag = hashlib.sha256(file_data).hexdigest()[:32]
+    return file_data, etag
+
+def save_image_upload(file_storage, kind):
+    """Run an uploaded image through the upload pipeline and store its variants; returns the reference.
+
+    Variants are content-addressed, so an identical upload maps to objects that
+    already exist and nothing is stored again.
+    """
+    reference, variants = uploads.process_image(file_storage.read(), kind)
+    client = get_supabase()
+    for variant, data in variants.items():
+        path = uploads.variant_path(reference, variant)
+        if client:
+            with metrics.timed('storage'):
+                client.storage.from_(SUPABASE_BUCKET).upload(
+                    path, data, {'content-type': uploads.mimetype_for(reference), 'upsert': 'true'})
+            continue
+        local_path = os.path.join(app.config['UPLOAD_FOLDER'], path)
+        if os.path.exists(local_path):
+            continue
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        tmp_path = f"{local_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, local_path)
+    print(f" * Upload stored: {reference} ({', '.join(f'{v} {len(d)} B' for v, d in variants.items())})")
+    return reference
+
+@app.template_global()
+def upload_url(reference, variant='screen'):
+    """URL of the variant of an upload a view needs ('print', 'screen' or 'thumb')"""
+    if not reference:
+        return ''
+    return url_for('serve_upload', filename=uploads.variant_path(reference, variant))
+
 @app.route('/uploads/<path:filename>')
 def serve_upload(filename):
+    if not uploads.is_public(filename):
+        return f"File not found: {filename}", 404
     client = get_supabase()
     if client and (filename.startswith("qr_codes/") or "/" in filename):
         try:
-            # Proxy from Supabase
-            file_data = client.storage.from_(SUPABASE_BUCKET).download(filename)
+            # Proxy from Supabase (through the local disk cache)
+            file_data, etag = read_cached_upload(filename)
             if file_data:
                 mime_type, _ = mimetypes.guess_type(filename)
                 response = make_response(file_data)
                 response.headers['Content-Type'] = mime_type or 'image/png'
                 response.headers['Access-Control-Allow-Origin'] = '*'
-                return response
+                response.headers['Cache-Control'] = UPLOAD_CACHE_CONTROL
+                response.set_etag(etag)
+                return response.make_conditional(request)
         except Exception as e:
             print(f" * Proxy error for {filename}: {e}")
             
@@ -120,47 +339,142 @@ def serve_upload(filename):
     try:
         response = make_response(send_from_directory(app.config['UPLOAD_FOLDER'], filename))
         response.headers['Access-Control-Allow-Origin'] = '*'
+        response.headers['Cache-Control'] = UPLOAD_CACHE_CONTROL
         return response
     except Exception as e:
         return f"File not found: {filename}", 404
 
+@app.route('/cache_stats')
+@login_required
+def cache_stats():
+    return jsonify({'upload_cache': get_upload_cache().stats(), 'bill_page_cache': get_bill_page_cache().stats()})
+
+@app.route('/metrics')
+def metrics_endpoint():
+    # Scrapers authenticate with METRICS_TOKEN; otherwise a logged-in session is required
+    if METRICS_TOKEN:
+        if request.headers.get('Authorization') != f'Bearer {METRICS_TOKEN}':
+            return "Unauthorized", 401
+    elif not current_user.is_authenticated:
+        return login_manager.unauthorized()
+
+    pool = pool_metrics.snapshot(db.engine.pool)
+    cache = get_upload_cache().stats()
+    pages = get_bill_page_cache().stats()
+    extra = [
+        ('billing_db_pool_checkouts_total', 'counter', 'Connections checked out of the pool.',
+         [([], pool['checkouts'])]),
+        ('billing_db_pool_checkout_seconds_max', 'gauge', 'Slowest pool checkout so far.',
+         [([], pool['checkout_max_ms'] / 1000)]),
+        ('billing_db_pool_checked_out', 'gauge', 'Connections currently checked out.',
+         [([], pool['checked_out'])]),
+        ('billing_db_connections_opened_total', 'counter', 'New database connections opened.',
+         [([], pool['connections_opened'])]),
+        ('billing_upload_cache_requests_total', 'counter', 'Upload cache lookups, by result.',
+         [([('result', 'hit')], cache['hits']), ([('result', 'miss')], cache['misses'])]),
+        ('billing_upload_cache_bytes', 'gauge', 'Bytes held in the upload cache.',
+         [([], cache['bytes'])]),
+        ('billing_bill_page_cache_requests_total', 'counter', 'Rendered bill page cache lookups, by result.',
+         [([('result', 'hit')], pages['hits']), ([('result', 'miss')], pages['misses'])]),
+    ]
+    return Response(request_metrics.render(extra), mimetype='text/plain; version=0.0.4')
+
+@app.route('/pool_stats')
+@login_required
+def pool_stats():
+    stats = {'mode': db_pool_mode, 'engine': pool_metrics.snapshot(db.engine.pool)}
+    if _counter_engine is not None:
+        stats['counter_engine'] = counter_pool_metrics.snapshot()
+    stats['password_hasher'] = password_hasher.stats()
+    return jsonify(stats)
+
 _cached_settings = None
-_cached_footer_base64 = None
+# The settings snapshot is shared by every template render. Other workers learn about
+# changes through the 'settings' cache version, checked at most once per TTL.
+SETTINGS_CACHE_TTL = float(os.environ.get('SETTINGS_CACHE_TTL', 5))
+_settings_cache_version = None
+_settings_checked_at = 0.0
+
+def get_cache_version(name):
+    """Current value of a shared cache version counter (0 if it was never bumped)"""
+    return db.session.execute(
+        text("SELECT version FROM cache_version WHERE name = :name"), {'name': name}
+    ).scalar() or 0
+
+def bump_cache_version(name):
+    """Increment a shared cache version inside the caller's transaction so every
+    worker reloads its copy once the change is committed"""
+    params = {'name': name}
+    db.session.execute(text("INSERT INTO cache_version (name, version) VALUES (:name, 0) ON CONFLICT (name) DO NOTHING"), params)
+    db.session.execute(text("UPDATE cache_version SET version = version + 1 WHERE name = :name"), params)
+
+# Process-local snapshot of the item catalog, keyed by the 'catalog' cache version
+_cached_catalog = {'version': None, 'items': [], 'flavors': {}}
+
+def get_catalog():
+    global _cached_catalog
+    version = get_cache_version('catalog')
+    if _cached_catalog['version'] != version:
+        items = []
+        flavors = {}
+        for item in Item.query.order_by(Item.id).all():
+            snapshot = SimpleNamespace(id=item.id, name=item.name, price=item.price, category=item.category,
+                                       is_flavor=item.is_flavor, description=item.description)
+            if item.is_flavor:
+                flavors.setdefault(item.category, []).append(snapshot)
+            else:
+                items.append(snapshot)
+        _cached_catalog = {'version': version, 'items': items, 'flavors': flavors}
+    return _cached_catalog
+
+def load_settings_snapshot(version):
+    """The shop settings snapshot for a 'settings' cache version, reloaded if ours is from another version"""
+    global _cached_settings, _settings_cache_version, _settings_checked_at
+    snapshot = _cached_settings
+    if snapshot and version == _settings_cache_version:
+        return snapshot
+
+    settings_record = ShopSettings.query.first()
+    if not settings_record:
+        settings_record = ShopSettings()
+        admin = User.query.filter_by(username='admin').first()
+        if admin:
+            settings_record.user_id = admin.id
+            db.session.add(settings_record)
+            db.session.commit()
+    
+    display_qr_path = getattr(settings_record, 'qr_code_path', '') or ''
+    
+    def get_display_settings(obj, qr_path):
+        return {
+            'shop_name': getattr(obj, 'shop_name', 'Sri Krishna Bakery') or 'Sri Krishna Bakery',
+            'company_name': getattr(obj, 'company_name', 'ice Berg') or 'ice Berg',
+            'address': getattr(obj, 'address', 'Your Shop Address here...') or 'Your Shop Address here...',
+            'mobile': getattr(obj, 'mobile', '9876543210') or '9876543210',
+            'mobile2': getattr(obj, 'mobile2', '') or '',
+            'qr_code_path': qr_path
+        }
+        
+    snapshot = SimpleNamespace(**get_display_settings(settings_record, display_qr_path))
+    _cached_settings = snapshot
+    _settings_cache_version = version
+    _settings_checked_at = time.monotonic()
+    return snapshot
 
 @app.context_processor
 def inject_settings():
-    global _cached_settings
+    global _settings_checked_at
     db_uri_config = app.config.get('SQLALCHEMY_DATABASE_URI', '')
     db_type = 'Persistent (PostgreSQL)' if 'postgresql' in db_uri_config else 'Persistent (Local SQLite)'
     
-    if _cached_settings:
+    now = time.monotonic()
+    if _cached_settings and now - _settings_checked_at < SETTINGS_CACHE_TTL:
         return dict(settings=_cached_settings, db_type=db_type)
     
     try:
-        settings_record = ShopSettings.query.first()
-        if not settings_record:
-            settings_record = ShopSettings()
-            admin = User.query.filter_by(username='admin').first()
-            if admin:
-                settings_record.user_id = admin.id
-                db.session.add(settings_record)
-                db.session.commit()
-        
-        display_qr_path = getattr(settings_record, 'qr_code_path', '') or ''
-        
-        def get_display_settings(obj, qr_path):
-            return {
-                'shop_name': getattr(obj, 'shop_name', 'Sri Krishna Bakery') or 'Sri Krishna Bakery',
-                'company_name': getattr(obj, 'company_name', 'ice Berg') or 'ice Berg',
-                'address': getattr(obj, 'address', 'Your Shop Address here...') or 'Your Shop Address here...',
-                'mobile': getattr(obj, 'mobile', '9876543210') or '9876543210',
-                'mobile2': getattr(obj, 'mobile2', '') or '',
-                'qr_code_path': qr_path
-            }
-            
-        settings_data = get_display_settings(settings_record, display_qr_path)
-        _cached_settings = SimpleNamespace(**settings_data)
-        return dict(settings=_cached_settings, db_type=db_type)
+        snapshot = load_settings_snapshot(get_cache_version('settings'))
+        _settings_checked_at = now
+        return dict(settings=snapshot, db_type=db_type)
     except Exception as e:
         print(f" * Error in inject_settings: {e}")
         fallback = SimpleNamespace(shop_name='Sri Krishna Bakery', company_name='ice Berg', address='Your Shop Address here...', mobile='9876543210', mobile2='', qr_code_path='')
@@ -182,7 +496,7 @@ def seed_data():
         admin = User.query.filter_by(username='admin').first()
         if not admin:
             print(" * Seeding: Creating default admin user...")
-            hashed_password = generate_password_hash('admin123', method='pbkdf2:sha256')
+            hashed_password = generate_password_hash('admin123', method=passwords.PASSWORD_HASH_METHOD)
             admin = User(username='admin', password=hashed_password)
             db.session.add(admin)
             db.session.commit()
@@ -232,6 +546,7 @@ def seed_data():
             for item_data in initial_items:
                 item = Item(**item_data)
                 db.session.add(item)
+            bump_cache_version('catalog')
         
         db.session.commit()
 
@@ -240,25 +555,24 @@ def seed_data():
             if not Item.query.filter_by(name=item_name).first():
                 new_item = Item(name=item_name, price=0, category='Main')
                 db.session.add(new_item)
+                bump_cache_version('catalog')
         
         db.session.commit()
 
 @app.route('/')
 @login_required
+@query_budget(4)
 def index():
     try:
-        items = Item.query.filter_by(is_flavor=False).all()
-        ice_cream_flavors = Item.query.filter_by(category='Ice Cream', is_flavor=True).all()
-        fruit_items = Item.query.filter_by(category='Fruits', is_flavor=True).all()
-        drink_items = Item.query.filter_by(category='Welcome Drinks', is_flavor=True).all()
-        beeda_items = Item.query.filter_by(category='Beeda', is_flavor=True).all()
+        catalog = get_catalog()
+        flavors = catalog['flavors']
         
         return render_template('dashboard.html', 
-                              items=items, 
-                              flavors=ice_cream_flavors, 
-                              fruit_items=fruit_items,
-                              drink_items=drink_items,
-                              beeda_items=beeda_items,
+                              items=catalog['items'], 
+                              flavors=flavors.get('Ice Cream', []), 
+                              fruit_items=flavors.get('Fruits', []),
+                              drink_items=flavors.get('Welcome Drinks', []),
+                              beeda_items=flavors.get('Beeda', []),
                               date=get_now())
     except Exception as e:
         import traceback
@@ -266,20 +580,47 @@ def index():
         print(f" * Error in index route: {error_msg}")
         return f"Database error or still initializing. <br><br>Error details: {str(e)} <br><br>If this is the first run, please refresh after 5 seconds.", 503
 
+def client_ip():
+    # Vercel's edge sets X-Forwarded-For; elsewhere the socket address is the client
+    if IS_VERCEL:
+        forwarded = request.headers.get('X-Forwarded-For', '')
+        if forwarded:
+            return forwarded.split(',')[0].strip()
+    return request.remote_addr or ''
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     try:
         if request.method == 'POST':
-            username = request.form.get('username')
-            password = request.form.get('password')
+            username = request.form.get('username') or ''
+            password = request.form.get('password') or ''
+            # Throttled before any hashing, so a burst costs no CPU past the limit
+            wait = login_throttle.check(client_ip(), username)
+            if wait:
+                flash(f'Too many login attempts. Try again in {wait} seconds.')
+                return render_template('login.html'), 429
             user = User.query.filter_by(username=username).first()
-            if user and check_password_hash(user.password, password):
+            matches, upgraded_hash = password_hasher.verify(user.password, password) if user else (False, None)
+            if matches:
+                login_throttle.succeeded(username)
+                if upgraded_hash:
+                    # Stored hash used an older method or cost: replace it now that we have the password
+                    user.password = upgraded_hash
+                    db.session.commit()
+                    print(f" * Upgraded password hash for {username} to {passwords.PASSWORD_HASH_METHOD}")
                 login_user(user, remember=True)
                 session.permanent = True
                 return redirect(url_for('index'))
             else:
+                login_throttle.failed(client_ip(), username)
                 flash('Invalid username or password')
         return render_template('login.html')
+    except passwords.HashingBusy:
+        flash('The server is busy. Please try again in a moment.')
+        return render_template('login.html'), 503
+    except passwords.HashingFailed:
+        flash('Could not check the password. Please try again.')
+        return render_template('login.html'), 503
     except Exception as e:
         print(f" * Error in login route: {e}")
         # If DB isn't ready, at least show the page
@@ -294,6 +635,13 @@ def signup():
         password = request.form.get('password')
         confirm_password = request.form.get('confirm_password')
 
+        wait = login_throttle.check(client_ip(), None)
+        if wait:
+            flash(f'Too many attempts. Try again in {wait} seconds.')
+            return render_template('signup.html'), 429
+        # Signups are rare, unlike logins at shift change: every attempt counts against the IP
+        login_throttle.failed(client_ip())
+
         if password != confirm_password:
             flash('Passwords do not match')
             return render_template('signup.html')
@@ -303,7 +651,11 @@ def signup():
             flash('Username already exists')
             return render_template('signup.html')
 
-        hashed_password = generate_password_hash(password, method='pbkdf2:sha256')
+        try:
+            hashed_password = password_hasher.hash(password)
+        except (passwords.HashingBusy, passwords.HashingFailed):
+            flash('The server is busy. Please try again in a moment.')
+            return render_template('signup.html'), 503
         new_user = User(username=username, password=hashed_password)
         db.session.add(new_user)
         db.session.commit()
@@ -319,28 +671,79 @@ def logout():
     logout_user()
     return redirect(url_for('login'))
 
-@app.route('/generate_bill', methods=['POST'])
-@login_required
-def generate_bill():
-    try:
-        data = request.json
-        bill_data = request.json.get('items', [])
-        grand_total = float(data.get('grand_total', 0) or 0)
-        advance_amount = float(data.get('advance_amount', 0) or 0)
-        discount_amount = float(data.get('discount_amount', 0) or 0)
-        balance_amount = float(data.get('balance_amount', grand_total - advance_amount - discount_amount) or 0)
-        party_number = data.get('party_number', '')
-        custom_location = data.get('location')
-        bill_date_str = data.get('date')
-        bill_time_str = data.get('time')
-        
-        bill_date = get_now()
-        if bill_date_str:
+# Bill numbers are sequential per day: BILL-YYYYMMDD-NNNNN. Each worker reserves a
+# block of numbers from bill_counter in one short transaction and hands them out
+# in-process, so concurrent checkouts never collide and rarely touch the counter row.
+# Numbers left over in a block when a worker exits are simply skipped.
+BILL_NUMBER_BLOCK_SIZE = int(os.environ.get('BILL_NUMBER_BLOCK_SIZE', 20))
+_bill_number_lock = threading.Lock()
+_bill_number_block = {'day': None, 'next': 1, 'end': 0}
+
+def _reset_bill_number_block():
+    _bill_number_block.update(day=None, next=1, end=0)
+
+# Forked workers must not hand out numbers from the parent's block
+os.register_at_fork(after_in_child=_reset_bill_number_block)
+
+_counter_engine = None
+counter_pool_metrics = pooling.PoolMetrics()
+
+def get_counter_engine():
+    # Reservations use their own unpooled connection: the request's session already
+    # holds a pooled one, and borrowing a second from an exhausted pool would deadlock.
+    global _counter_engine
+    if _counter_engine is None:
+        from sqlalchemy import create_engine
+        from sqlalchemy.pool import NullPool
+        _counter_engine = create_engine(
+            db.engine.url,
+            poolclass=pooling.timed_pool_class(NullPool, counter_pool_metrics),
+            connect_args=pooling.connect_args_for(db_uri, db_pool_mode)
+        )
+    return _counter_engine
+
+def reserve_bill_number_block(day, size):
+    """Atomically advance the counter for `day` by `size` and return the reserved (start, end)"""
+    params = {'day': day, 'size': size}
+    with get_counter_engine().begin() as conn:
+        conn.execute(text("INSERT INTO bill_counter (day, value) VALUES (:day, 0) ON CONFLICT (day) DO NOTHING"), params)
+        conn.execute(text("UPDATE bill_counter SET value = value + :size WHERE day = :day"), params)
+        end = conn.execute(text("SELECT value FROM bill_counter WHERE day = :day"), params).scalar()
+    return end - size + 1, end
+
+def allocate_bill_number():
+    day = get_now().strftime('%Y%m%d')
+    with _bill_number_lock:
+        block = _bill_number_block
+        if block['day'] != day or block['next'] > block['end']:
+            start, end = reserve_bill_number_block(day, BILL_NUMBER_BLOCK_SIZE)
+            block.update(day=day, next=start, end=end)
+        number = block['next']
+        block['next'] += 1
+    return f"BILL-{day}-{number:05d}"
+
+def parse_bill_date(bill_date_str, bill_time_str):
+    bill_date = get_now()
+    if bill_date_str:
+        try:
+            # Handle dd/mm/yyyy format
+            bill_date = datetime.strptime(bill_date_str, '%d/%m/%Y')
+            
+            # If time is provided, use it, otherwise use current time
+            if bill_time_str:
+                try:
+                    time_parts = datetime.strptime(bill_time_str, '%H:%M')
+                    bill_date = bill_date.replace(hour=time_parts.hour, minute=time_parts.minute, second=0)
+                except ValueError:
+                    now = get_now()
+                    bill_date = bill_date.replace(hour=now.hour, minute=now.minute, second=now.second)
+            else:
+                now = get_now()
+                bill_date = bill_date.replace(hour=now.hour, minute=now.minute, second=now.second)
+        except ValueError:
             try:
-                # Handle dd/mm/yyyy format
-                bill_date = datetime.strptime(bill_date_str, '%d/%m/%Y')
-                
-                # If time is provided, use it, otherwise use current time
+                # Fallback to standard ISO format
+                bill_date = datetime.strptime(bill_date_str, '%Y-%m-%d')
                 if bill_time_str:
                     try:
                         time_parts = datetime.strptime(bill_time_str, '%H:%M')
@@ -352,76 +755,136 @@ def generate_bill():
                     now = get_now()
                     bill_date = bill_date.replace(hour=now.hour, minute=now.minute, second=now.second)
             except ValueError:
-                try:
-                    # Fallback to standard ISO format
-                    bill_date = datetime.strptime(bill_date_str, '%Y-%m-%d')
-                    if bill_time_str:
-                        try:
-                            time_parts = datetime.strptime(bill_time_str, '%H:%M')
-                            bill_date = bill_date.replace(hour=time_parts.hour, minute=time_parts.minute, second=0)
-                        except ValueError:
-                            now = get_now()
-                            bill_date = bill_date.replace(hour=now.hour, minute=now.minute, second=now.second)
-                    else:
-                        now = get_now()
-                        bill_date = bill_date.replace(hour=now.hour, minute=now.minute, second=now.second)
-                except ValueError:
-                    pass
+                pass
+    return bill_date
+
+def get_billing_settings():
+    # Use global settings
+    settings_record = ShopSettings.query.first()
+    if not settings_record:
+        settings_record = ShopSettings()
+    return settings_record
+
+def build_bill(data, settings_record):
+    """Build an unsaved Bill (without bill number) from a /generate_bill payload"""
+    grand_total = float(data.get('grand_total', 0) or 0)
+    advance_amount = float(data.get('advance_amount', 0) or 0)
+    discount_amount = float(data.get('discount_amount', 0) or 0)
+    balance_amount = float(data.get('balance_amount', grand_total - advance_amount - discount_amount) or 0)
+    custom_location = data.get('location')
+
+    return Bill(
+        date=parse_bill_date(data.get('date'), data.get('time')),
+        company_name=settings_record.company_name,
+        shop_name=settings_record.shop_name,
+        location=custom_location if custom_location else '',
+        shop_address=settings_record.address,
+        shop_mobile=settings_record.mobile,
+        shop_mobile2=settings_record.mobile2,
+        grand_total=grand_total,
+        advance_amount=advance_amount,
+        discount_amount=discount_amount,
+        balance_amount=balance_amount,
+        party_number=data.get('party_number', ''),
+        qr_code_path=settings_record.qr_code_path, # SNAPSHOT: Save the QR code used for this bill
+        idempotency_key=data.get('idempotency_key') or None
+    )
+
+def load_missing_descriptions(item_lists):
+    """Catalog descriptions for every line item whose payload omits 'description', in one IN query"""
+    # Description flow: Payload -> DB Lookup (if payload value is missing) -> Final
+    # We treat empty string as a valid "no description" if the user intentionally cleared it
+    missing_names = {
+        item.get('name') for items in item_lists for item in items
+        if isinstance(item, dict) and isinstance(item.get('name'), str) and item.get('description') is None
+    }
+    if not missing_names:
+        return {}
+    return dict(db.session.query(Item.name, Item.description).filter(Item.name.in_(missing_names)).all())
+
+def build_bill_item_rows(items, catalog_descriptions):
+    """BillItem insert rows (bill_id still to be filled in) for a payload's line items"""
+    rows = []
+    for item in items:
+        item_desc = item.get('description')
+        if item_desc is None:
+            # Only fallback to DB if the key was completely missing
+            item_desc = catalog_descriptions.get(item['name'])
+            app.logger.debug("Falling back to DB description for '%s': [%s]", item['name'], item_desc)
+
+        rows.append({
+            'item_name': item['name'],
+            'quantity': item['quantity'],
+            'unit_price': item['price'],
+            'total_price': item['total'],
+            'item_description': item_desc
+        })
+    return rows
+
+def enqueue_bill_post_jobs(bill_numbers):
+    # Rendered and uploaded in the background, committed with the bill itself
+    if app.config['BILL_POST_JOBS']:
+        for bill_number in bill_numbers:
+            jobs.enqueue('render_bill', {'bill_number': bill_number})
+
+def bill_result(bill_number, status='success'):
+    return {'status': status, 'bill_number': bill_number, 'view_url': url_for('view_bill', bill_number=bill_number)}
+
+def _check_text(value, field, max_length):
+    if value is not None and not isinstance(value, str):
+        raise ValueError(f"{field} must be a string")
+    if value and len(value) > max_length:
+        raise ValueError(f"{field} is longer than {max_length} characters")
+
+def _check_number(value, field):
+    # bool is an int subclass, but never a valid amount
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"{field} must be a number")
+
+@app.route('/generate_bill', methods=['POST'])
+@login_required
+@query_budget(12)
+def generate_bill():
+    try:
+        data = request.json
+        idempotency_key = data.get('idempotency_key')
+        try:
+            _check_text(idempotency_key, 'idempotency_key', 64)
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': f'Invalid bill: {str(e)}'}), 400
+        if idempotency_key:
+            # Retried submission of a bill we already saved
+            existing = Bill.query.filter_by(idempotency_key=idempotency_key).first()
+            if existing:
+                return jsonify(bill_result(existing.bill_number, 'duplicate'))
+
+        new_bill = build_bill(data, get_billing_settings())
+        new_bill.bill_number = allocate_bill_number()
+        items = data.get('items', [])
+        bill_item_rows = build_bill_item_rows(items, load_missing_descriptions([items]))
 
-        # Use global settings
-        settings_record = ShopSettings.query.first()
-        if not settings_record:
-            settings_record = ShopSettings()
-            
-        bill_number = f"BILL-{get_now().strftime('%Y%m%d%H%M%S')}"
-        
-        new_bill = Bill(
-            bill_number=bill_number,
-            date=bill_date,
-            company_name=settings_record.company_name,
-            shop_name=settings_record.shop_name,
-            location=custom_location if custom_location else '',
-            shop_address=settings_record.address,
-            shop_mobile=settings_record.mobile,
-            shop_mobile2=settings_record.mobile2,
-            grand_total=grand_total,
-            advance_amount=advance_amount,
-            discount_amount=discount_amount,
-            balance_amount=balance_amount,
-            party_number=party_number,
-            qr_code_path=settings_record.qr_code_path # SNAPSHOT: Save the QR code used for this bill
-        )
         db.session.add(new_bill)
         db.session.flush() # Get the bill id
-        
-        for item in bill_data:
-            # Description flow: Payload -> DB Lookup (if payload value is missing) -> Final
-            # We treat empty string as a valid "no description" if the user intentionally cleared it
-            item_desc = item.get('description')
-            print(f" * DEBUG: Item '{item.get('name')}' receives payload description: [{item_desc}]")
-            
-            if item_desc is None:
-                # Only fallback to DB if the key was completely missing
-                db_item = Item.query.filter_by(name=item['name']).first()
-                item_desc = db_item.description if db_item else None
-                print(f" * DEBUG: Falling back to DB for '{item.get('name')}': [{item_desc}]")
-            
-            print(f" * DEBUG: Final item_description for '{item.get('name')}': [{item_desc}]")
-                
-            bill_item = BillItem(
-                bill_id=new_bill.id,
-                item_name=item['name'],
-                quantity=item['quantity'],
-                unit_price=item['price'],
-                total_price=item['total'],
-                item_description=item_desc
-            )
-            db.session.add(bill_item)
+        if bill_item_rows:
+            for row in bill_item_rows:
+                row['bill_id'] = new_bill.id
+            db.session.execute(insert(BillItem), bill_item_rows)
+        reports.apply_sales_summary([(new_bill, bill_item_rows)])
+        search.index_bills([(new_bill, bill_item_rows)])
+        enqueue_bill_post_jobs([new_bill.bill_number])
         
         # Save session to get IDs for PDF generation
         db.session.commit()
         
-        return jsonify({'status': 'success', 'bill_number': bill_number, 'view_url': url_for('view_bill', bill_number=bill_number)})
+        return jsonify(bill_result(new_bill.bill_number))
+    except IntegrityError:
+        db.session.rollback()
+        # A concurrent retry with the same idempotency key won the race
+        existing = Bill.query.filter_by(idempotency_key=idempotency_key).first() if idempotency_key else None
+        if existing:
+            return jsonify(bill_result(existing.bill_number, 'duplicate'))
+        print(" * ERROR in generate_bill: integrity error")
+        return jsonify({'status': 'error', 'message': 'Server error: could not save bill'}), 500
     except Exception as e:
         db.session.rollback()
         print(f" * ERROR in generate_bill: {str(e)}")
@@ -429,28 +892,158 @@ def generate_bill():
         traceback.print_exc()
         return jsonify({'status': 'error', 'message': f'Server error: {str(e)}'}), 500
 
-def run_migrations():
-    from sqlalchemy import text
+MAX_BATCH_BILLS = 200
+
+def validate_batch_bill(payload):
+    """Reject a batch payload that would only fail at flush (and roll back the whole batch)"""
+    _check_text(payload.get('idempotency_key'), 'idempotency_key', 64)
+    _check_text(payload.get('party_number'), 'party_number', 50)
+    _check_text(payload.get('location'), 'location', 150)
+    for field in ('date', 'time'):
+        _check_text(payload.get(field), field, 32)
+    items = payload.get('items') or []
+    if not isinstance(items, list):
+        raise ValueError("items must be a list")
+    for item in items:
+        if not isinstance(item, dict):
+            raise ValueError("each item must be an object")
+        if not item.get('name'):
+            raise ValueError("item name is required")
+        _check_text(item['name'], 'item name', 100)
+        _check_text(item.get('description'), 'item description', 500)
+        for field in ('quantity', 'price', 'total'):
+            _check_number(item.get(field), f'item {field}')
+        if item['quantity'] != int(item['quantity']):
+            raise ValueError("item quantity must be a whole number")
+
+def save_bill_batch(payloads):
+    """Insert a batch of bill payloads in the current transaction.
+
+    Every payload must carry a client-generated idempotency_key. Keys that already
+    exist (or repeat within the batch) are reported as duplicates instead of being
+    inserted again; invalid payloads are reported as errors without failing the rest.
+    """
+    keys = {p.get('idempotency_key') for p in payloads
+            if isinstance(p, dict) and isinstance(p.get('idempotency_key'), str) and p.get('idempotency_key')}
+    saved = {}
+    if keys:
+        saved = dict(db.session.query(Bill.idempotency_key, Bill.bill_number).filter(Bill.idempotency_key.in_(keys)).all())
+
+    settings_record = get_billing_settings()
+    catalog_descriptions = load_missing_descriptions(
+        [p.get('items') or [] for p in payloads if isinstance(p, dict) and isinstance(p.get('items'), list)]
+    )
+
     results = []
-    
-    def try_alter(table, column, col_type):
+    new_bills = []
+    for payload in payloads:
+        key = payload.get('idempotency_key') if isinstance(payload, dict) else None
+        if not key:
+            results.append({'idempotency_key': key, 'status': 'error', 'message': 'idempotency_key is required'})
+            continue
         try:
-            # Use AUTOCOMMIT to prevent transaction poisoning on Postgres
-            with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
-                conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {col_type}'))
-            return f"Successfully added {table}.{column}"
+            validate_batch_bill(payload)
+        except ValueError as e:
+            results.append({'idempotency_key': key if isinstance(key, str) else None, 'status': 'error',
+                            'message': f'Invalid bill: {str(e)}'})
+            continue
+        if key in saved:
+            results.append(dict(bill_result(saved[key], 'duplicate'), idempotency_key=key))
+            continue
+        try:
+            bill = build_bill(payload, settings_record)
+            bill_item_rows = build_bill_item_rows(payload.get('items') or [], catalog_descriptions)
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            results.append({'idempotency_key': key, 'status': 'error', 'message': f'Invalid bill: {str(e)}'})
+            continue
+
+        bill.bill_number = allocate_bill_number()
+        saved[key] = bill.bill_number
+        new_bills.append((bill, bill_item_rows))
+        results.append(dict(bill_result(bill.bill_number, 'created'), idempotency_key=key))
+
+    if new_bills:
+        db.session.add_all([bill for bill, _ in new_bills])
+        db.session.flush() # Batched INSERT ... RETURNING for the bill ids
+        all_rows = []
+        for bill, rows in new_bills:
+            for row in rows:
+                row['bill_id'] = bill.id
+            all_rows.extend(rows)
+        if all_rows:
+            db.session.execute(insert(BillItem), all_rows)
+        reports.apply_sales_summary(new_bills)
+        search.index_bills(new_bills)
+        enqueue_bill_post_jobs([bill.bill_number for bill, _ in new_bills])
+    return results
+
+@app.route('/generate_bills', methods=['POST'])
+@login_required
+def generate_bills():
+    data = request.get_json(silent=True) or {}
+    payloads = data.get('bills')
+    if not isinstance(payloads, list) or not payloads:
+        return jsonify({'status': 'error', 'message': 'Expected a non-empty "bills" array'}), 400
+    if len(payloads) > MAX_BATCH_BILLS:
+        return jsonify({'status': 'error', 'message': f'At most {MAX_BATCH_BILLS} bills per batch'}), 413
+
+    # A concurrent retry of the same batch may insert one of our keys first; the
+    # unique constraint rejects our copy and the second pass reports it as a duplicate.
+    for attempt in range(2):
+        try:
+            results = save_bill_batch(payloads)
+            db.session.commit()
+            return jsonify({'status': 'success', 'results': results})
+        except IntegrityError:
+            db.session.rollback()
         except Exception as e:
-            err_str = str(e).lower()
-            if "already exists" in err_str or "duplicate column" in err_str:
-                return f"{table}.{column} already exists"
-            return f"FAILED to add {table}.{column}: {str(e)}"
+            db.session.rollback()
+            print(f" * ERROR in generate_bills: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            return jsonify({'status': 'error', 'message': f'Server error: {str(e)}'}), 500
+    return jsonify({'status': 'error', 'message': 'Conflicting concurrent submission, please retry'}), 409
 
+# Schema migrations are ordered steps recorded in schema_version once applied, so a
+# warm database costs a single version query at startup. Steps must be idempotent:
+# two cold starts racing on a fresh database may both run the same step.
+# Append new steps at the end; never renumber or edit applied ones.
+
+def try_alter(table, column, col_type):
+    try:
+        # Use AUTOCOMMIT to prevent transaction poisoning on Postgres
+        with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {col_type}'))
+        return f"Successfully added {table}.{column}"
+    except Exception as e:
+        err_str = str(e).lower()
+        if "already exists" in err_str or "duplicate column" in err_str:
+            return f"{table}.{column} already exists"
+        return f"FAILED to add {table}.{column}: {str(e)}"
+
+def try_index(name, table, columns, unique=False):
+    try:
+        with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            kind = 'UNIQUE INDEX' if unique else 'INDEX'
+            conn.execute(text(f'CREATE {kind} IF NOT EXISTS {name} ON {table} ({columns})'))
+        return f"Ensured index {name}"
+    except Exception as e:
+        return f"FAILED to create index {name}: {str(e)}"
+
+def migrate_create_tables():
+    # Creates any missing tables (including schema_version itself)
+    db.create_all()
+    return ["Ensured all tables exist"]
+
+def migrate_legacy_columns():
+    results = []
     # 1. Bill table columns
     bill_cols = [
         ('party_number', 'VARCHAR(50)'),
         ('qr_code_path', 'VARCHAR(255)'),
         ('pdf_path', 'VARCHAR(255)'),
-        ('location', 'VARCHAR(150)')
+        ('location', 'VARCHAR(150)'),
+        ('idempotency_key', 'VARCHAR(64)')
     ]
     for col, ctype in bill_cols:
         results.append(try_alter('bill', col, ctype))
@@ -461,19 +1054,143 @@ def run_migrations():
     # 3. Item and BillItem description columns
     results.append(try_alter('item', 'description', 'VARCHAR(500)'))
     results.append(try_alter('bill_item', 'item_description', 'VARCHAR(500)'))
+    return results
+
+def migrate_indexes():
+    # Indexes for history pagination, bill rendering, the dashboard catalog and idempotent submission
+    return [
+        try_index('ix_bill_date_id', 'bill', 'date, id'),
+        try_index('ix_bill_item_bill_id', 'bill_item', 'bill_id'),
+        try_index('ix_item_category_is_flavor', 'item', 'category, is_flavor'),
+        try_index('ix_bill_idempotency_key', 'bill', 'idempotency_key', unique=True)
+    ]
+
+def migrate_branding():
+    with db.engine.connect() as conn:
+        variations = ['ICEBERG', 'Iceberg', 'iceberg', 'Ice Berg', 'Ice berg']
+        params = {'variations': variations}
+        conn.execute(text("UPDATE shop_settings SET company_name = 'ice Berg' WHERE company_name IN :variations")
+                     .bindparams(bindparam('variations', expanding=True)), params)
+        conn.execute(text("UPDATE bill SET company_name = 'ice Berg' WHERE company_name IN :variations")
+                     .bindparams(bindparam('variations', expanding=True)), params)
+        conn.commit()
+    return ["Ensured 'ice Berg' branding"]
+
+def migrate_seed_data():
+    seed_data()
+    return ["Seeded default admin, shop settings and items"]
+
+def migrate_sales_summary():
+    db.create_all()
+    rows = reports.rebuild_sales_summary()
+    db.session.commit()
+    return [f"Built daily_sales_summary from existing bills ({rows} rows)"]
+
+def migrate_search_index():
+    search.create_search_index()
+    count = search.rebuild_search_index()
+    db.session.commit()
+    return [f"Built bill_search index ({count} bills)"]
 
-    # 4. Data Migration (Separate transaction)
+def migrate_bill_archive():
+    db.create_all()
+    if db.engine.dialect.name == 'postgresql':
+        # Archiving deletes the bill row but keeps its search entry
+        db.session.execute(text("ALTER TABLE bill_search DROP CONSTRAINT IF EXISTS bill_search_bill_id_fkey"))
+        db.session.commit()
+    return ["Ensured archived_bill table"]
+
+def migrate_bill_autoincrement():
+    # SQLite hands a deleted or archived bill's id to the next insert unless the table is
+    # AUTOINCREMENT, which it only gets by being rebuilt. Postgres ids come from a sequence.
+    if db.engine.dialect.name != 'sqlite':
+        return ["Bill ids come from a sequence"]
+    ddl = db.session.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'bill'")).scalar()
+    if 'AUTOINCREMENT' in (ddl or '').upper():
+        return ["Bill ids already AUTOINCREMENT"]
+    from sqlalchemy import MetaData
+    from sqlalchemy.schema import CreateTable
+    columns = ', '.join(column.name for column in Bill.__table__.columns)
+    db.session.execute(CreateTable(Bill.__table__.to_metadata(MetaData(), name='bill_new')))
+    db.session.execute(text(f"INSERT INTO bill_new ({columns}) SELECT {columns} FROM bill"))
+    db.session.execute(text("DROP TABLE bill"))
+    db.session.execute(text("ALTER TABLE bill_new RENAME TO bill"))
+    for index in Bill.__table__.indexes:
+        index.create(db.session.connection(), checkfirst=True)
+    # Start past every id an archived bill still holds
+    top = db.session.execute(text(
+        "SELECT MAX(id) FROM (SELECT MAX(id) AS id FROM bill UNION ALL SELECT MAX(id) FROM archived_bill)"
+    )).scalar() or 0
+    db.session.execute(text("DELETE FROM sqlite_sequence WHERE name = 'bill'"))
+    db.session.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES ('bill', :seq)"), {'seq': top})
+    db.session.commit()
+    return [f"Rebuilt bill with AUTOINCREMENT ids (next id after {top})"]
+
+def migrate_archived_sales_summary():
+    db.create_all()
+    if ArchivedSalesSummary.query.first() is not None or ArchivedBill.query.first() is None:
+        return ["Ensured archived_sales_summary table"]
+    # Bills archived before the table existed: their lines are only in the segments
+    count = 0
+    bills = []
+    for bill in archive.iter_archived_bills(get_storage_bucket()):
+        bills.append((bill, bill.items))
+        if len(bills) >= 1000:
+            reports.archive_sales_summary(bills)
+            count += len(bills)
+            bills = []
+    reports.archive_sales_summary(bills)
+    count += len(bills)
+    db.session.commit()
+    return [f"Built archived_sales_summary from archive segments ({count} bills)"]
+
+MIGRATIONS = [
+    (1, 'create tables', migrate_create_tables),
+    (2, 'legacy columns', migrate_legacy_columns),
+    (3, 'indexes', migrate_indexes),
+    (4, 'ice Berg branding', migrate_branding),
+    (5, 'seed defaults', migrate_seed_data),
+    (6, 'daily sales summary', migrate_sales_summary),
+    (7, 'bill search index', migrate_search_index),
+    (8, 'bill archive index', migrate_bill_archive),
+    (9, 'bill autoincrement ids', migrate_bill_autoincrement),
+    (10, 'archived sales summary', migrate_archived_sales_summary),
+]
+LATEST_SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version():
     try:
         with db.engine.connect() as conn:
-            variations = ['ICEBERG', 'Iceberg', 'iceberg', 'Ice Berg', 'Ice berg']
-            for var in variations:
-                conn.execute(text(f"UPDATE shop_settings SET company_name = 'ice Berg' WHERE company_name = '{var}'"))
-                conn.execute(text(f"UPDATE bill SET company_name = 'ice Berg' WHERE company_name = '{var}'"))
-            conn.commit()
-            results.append("Ensured 'ice Berg' branding")
-    except Exception as e:
-        results.append(f"Branding update skipped: {str(e)}")
+            return conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+    except Exception:
+        # Table missing: database predates versioned migrations (or is empty)
+        return 0
 
+def run_migrations():
+    """Apply every migration step newer than the recorded schema version"""
+    results = []
+    current = get_schema_version()
+    for version, name, step in MIGRATIONS:
+        if version <= current:
+            continue
+        try:
+            step_results = step()
+        except Exception as e:
+            db.session.rollback()
+            results.append(f"FAILED migration {version} ({name}): {str(e)}")
+            break
+        results.extend(step_results)
+        if any(r.startswith('FAILED') for r in step_results):
+            results.append(f"Stopped at migration {version} ({name})")
+            break
+        try:
+            db.session.add(SchemaVersion(version=version, name=name, applied_at=datetime.utcnow()))
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback() # Another process recorded it first
+        results.append(f"Applied migration {version} ({name})")
+    if not results:
+        results.append(f"Schema up to date (version {current})")
     return results
 
 @app.route('/check_db')
@@ -494,46 +1211,315 @@ def check_db():
 @app.route('/migrate_db')
 def migrate_db_route():
     results = run_migrations()
-    return f"Migration results (v3): <br> - " + "<br> - ".join(results)
+    return f"Migration results (schema v{get_schema_version()}): <br> - " + "<br> - ".join(results)
 
 @app.route('/version')
 def version():
-    return "v3 - Autocommit Migrations"
+    return f"v4 - Versioned Migrations (schema v{LATEST_SCHEMA_VERSION})"
+
+def get_footer_image_path():
+    """First image in static/images/bill_footer (the payment QR printed on every bill), or None"""
+    footer_dir = os.path.join(app.root_path, 'static', 'images', 'bill_footer')
+    if os.path.exists(footer_dir):
+        image_files = sorted(f for f in os.listdir(footer_dir) if f.lower().endswith(('.png', '.jpg', '.jpeg', '.webp')))
+        if image_files:
+            return os.path.join(footer_dir, image_files[0])
+    return None
+
+# The footer is shown at most 150 CSS px wide and html2canvas captures at scale 2;
+# BILL_FOOTER_WIDTH=0 serves the original file
+BILL_FOOTER_WIDTH = int(os.environ.get('BILL_FOOTER_WIDTH', 300))
+_footer_asset = None
+
+def resize_footer_image(data):
+    from PIL import Image  # imported on first use, off the cold-start path
+    import io
+    with Image.open(io.BytesIO(data)) as image:
+        if image.width <= BILL_FOOTER_WIDTH:
+            return data
+        image_format = image.format
+        image.thumbnail((BILL_FOOTER_WIDTH, image.height))
+        out = io.BytesIO()
+        if image_format == 'JPEG':
+            image.convert('RGB').save(out, 'JPEG', quality=90, optimize=True)
+        else:
+            image.save(out, image_format)
+        return out.getvalue()
+
+def get_footer_asset():
+    """The footer image as served to bill pages (digest, ext, mimetype, data), or None.
+
+    Rebuilt when the source file changes, which changes its URL.
+    """
+    global _footer_asset
+    path = get_footer_image_path()
+    if path is None:
+        return None
+    stat = os.stat(path)
+    source = (path, stat.st_mtime, stat.st_size)
+    if _footer_asset is None or _footer_asset.source != source:
+        with open(path, 'rb') as f:
+            data = f.read()
+        if BILL_FOOTER_WIDTH:
+            data = resize_footer_image(data)
+        ext = os.path.splitext(path)[1].lower().lstrip('.')
+        _footer_asset = SimpleNamespace(
+            source=source,
+            data=data,
+            ext=ext,
+            mimetype=mimetypes.guess_type(path)[0] or 'image/png',
+            digest=hashlib.sha256(data).hexdigest()[:16]
+        )
+    return _footer_asset
+
+@app.route('/bill_footer/<digest>.<ext>')
+def bill_footer(digest, ext):
+    footer = get_footer_asset()
+    if footer is None:
+        return "No footer image", 404
+    if digest != footer.digest or ext != footer.ext:
+        # Page rendered before the image changed: point it at the current version
+        return redirect(url_for('bill_footer', digest=footer.digest, ext=footer.ext))
+    response = make_response(footer.data)
+    response.headers['Content-Type'] = footer.mimetype
+    response.headers['Access-Control-Allow-Origin'] = '*'  # html2canvas loads it with useCORS
+    response.headers['Cache-Control'] = UPLOAD_CACHE_CONTROL
+    response.set_etag(footer.digest)
+    return response.make_conditional(request)
+
+_bill_page_cache = None
+def get_bill_page_cache():
+    global _bill_page_cache
+    if _bill_page_cache is None:
+        _bill_page_cache = DiskLRUCache(app.config['BILL_PAGE_CACHE_FOLDER'], app.config['BILL_PAGE_CACHE_MAX_BYTES'])
+    return _bill_page_cache
+
+def get_bill_footer_url():
+    # Fixed image from 'static/images/bill_footer', linked by content hash so browsers cache it
+    try:
+        footer = get_footer_asset()
+        if footer:
+            return url_for('bill_footer', digest=footer.digest, ext=footer.ext)
+    except Exception as e:
+        print(f" * ERROR: Footer image loading failed: {e}")
+    return ""
+
+def bill_page_tag(footer_image_url):
+    """(tag, settings version): everything besides the bill itself that a rendered bill page depends on.
+
+    Bills never change once saved, so a cached page stays valid until the template,
+    the shop settings or the footer image change, or bills are deleted ('bill_pages').
+    A page must be rendered with the settings of the version in its tag.
+    """
+    template_path = os.path.join(app.root_path, app.template_folder, 'bill_view.html')
+    stat = os.stat(template_path)
+    versions = dict(db.session.execute(
+        text("SELECT name, version FROM cache_version WHERE name IN ('settings', 'bill_pages')")
+    ).all())
+    settings_version = versions.get('settings', 0)
+    tag = (f"{stat.st_mtime_ns}:{stat.st_size}|{settings_version}|"
+           f"{versions.get('bill_pages', 0)}|{footer_image_url}").encode('utf-8')
+    return tag, settings_version
+
+def read_cached_bill_page(bill_number, tag):
+    """(html bytes, etag) of a cached page rendered under the same tag, or (None, None)"""
+    cached = get_bill_page_cache().get(bill_number)
+    if cached:
+        path, etag = cached
+        try:
+            with open(path, 'rb') as f:
+                cached_tag, _, html = f.read().partition(b'\n')
+            if cached_tag == tag:
+                return html, etag
+        except OSError:
+            pass  # evicted between lookup and read
+    return None, None
+
+def discard_cached_bill_pages(bill_number=None):
+    cache = get_bill_page_cache()
+    if bill_number is None:
+        cache.clear()
+    else:
+        cache.discard(bill_number)
 
 @app.route('/view_bill/<bill_number>')
 @login_required
+@query_budget(5)  # cache miss after a settings change; a cached page takes 2
 def view_bill(bill_number):
     try:
-        bill = Bill.query.filter_by(bill_number=bill_number).first_or_404()
-        
-        # NEW REQUIREMENT: Load fixed image from local folder 'static/images/bill_footer'
-        global _cached_footer_base64
-        
-        if not _cached_footer_base64:
-            footer_dir = os.path.join(app.root_path, 'static', 'images', 'bill_footer')
-            if os.path.exists(footer_dir):
-                image_files = [f for f in os.listdir(footer_dir) if f.lower().endswith(('.png', '.jpg', '.jpeg', '.webp'))]
-                if image_files:
-                    footer_img_path = os.path.join(footer_dir, image_files[0])
-                    try:
-                        with open(footer_img_path, "rb") as img_file:
-                            encoded_string = base64.b64encode(img_file.read()).decode('utf-8')
-                            mime_type, _ = mimetypes.guess_type(footer_img_path)
-                            _cached_footer_base64 = f"data:{mime_type or 'image/png'};base64,{encoded_string}"
-                    except Exception as e:
-                        print(f" * ERROR: Footer image loading failed: {e}")
-        
-        return render_template('bill_view.html', bill=bill, qr_code_base64=_cached_footer_base64 or "")
+        footer_image_url = get_bill_footer_url()
+        tag, settings_version = bill_page_tag(footer_image_url)
+        html, etag = read_cached_bill_page(bill_number, tag)
+        if html is None:
+            bill = Bill.query.options(selectinload(Bill.items)).filter_by(bill_number=bill_number).first() \
+                or load_archived_bill(bill_number)
+            if bill is None:
+                abort(404)
+            # Rendered with the settings of the tag's version, not a snapshot up to SETTINGS_CACHE_TTL old
+            html = render_template('bill_view.html', bill=bill, footer_image_url=footer_image_url,
+                                   settings=load_settings_snapshot(settings_version)).encode('utf-8')
+            try:
+                # Stored with its tag on the first line; a page rendered under an older tag is replaced
+                _, etag = get_bill_page_cache().put(bill_number, tag + b'\n' + html)
+            except OSError as e:
+                print(f" * Bill page cache write failed for {bill_number}: {e}")
+                etag = hashlib.sha256(tag + b'\n' + html).hexdigest()[:32]
+
+        response = make_response(html)
+        response.headers['Content-Type'] = 'text/html; charset=utf-8'
+        # Behind login, so only the browser may keep it; it revalidates with the ETag each time
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.set_etag(etag)
+        return response.make_conditional(request)
     except Exception as e:
         print(f" * Error in view_bill route: {e}")
         return redirect(url_for('index'))
 
+HISTORY_PAGE_SIZE = 50
+
+def encode_history_cursor(bill):
+    """Opaque cursor pointing at the last bill shown on a history page"""
+    raw = f"{bill.date.isoformat()}|{bill.id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_history_cursor(cursor):
+    if not cursor:
+        return None, None
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        date_str, bill_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(date_str), int(bill_id)
+    except Exception:
+        return None, None
+
+def load_archived_bill(bill_number):
+    # Read-through for bills moved out of the live tables by archive_bills.py
+    with metrics.timed('storage'):
+        return archive.load_archived_bill(get_storage_bucket(), bill_number, cache=get_upload_cache())
+
+BILL_BUCKET_PREFIX = 'bills'
+
+def rendered_bill_filename(bill_number, fmt):
+    return secure_filename(f"{bill_number}.{fmt}")
+
+def discard_rendered_bills(bill_numbers, clear_folder=False):
+    """Delete bills' rendered documents locally and from the bucket; clear_folder empties the local folder"""
+    folder = app.config['BILL_RENDER_FOLDER']
+    filenames = [rendered_bill_filename(number, fmt) for number in bill_numbers for fmt in ('pdf', 'png')]
+    if clear_folder:
+        filenames = set(filenames) | {name for name in os.listdir(folder) if name.endswith(('.pdf', '.png'))}
+    for filename in filenames:
+        try:
+            os.remove(os.path.join(folder, filename))
+        except FileNotFoundError:
+            pass
+    # Uploaded copies (see upload_bill_job); other instances' local renders go with their /tmp
+    pdfs = [f"{BILL_BUCKET_PREFIX}/{name}" for name in filenames if name.endswith('.pdf')]
+    try:
+        for start in range(0, len(pdfs), 1000):
+            get_storage_bucket().remove(pdfs[start:start + 1000])
+    except Exception as e:
+        print(f" * Failed to remove uploaded bills: {e}")
+
+def ensure_rendered_bill(bill_number, fmt):
+    """Render a bill document into BILL_RENDER_FOLDER unless it is already there.
+
+    Returns the filename, or None if the bill does not exist.
+    """
+    # Bills never change once saved, so each document is rendered once
+    filename = rendered_bill_filename(bill_number, fmt)
+    path = os.path.join(app.config['BILL_RENDER_FOLDER'], filename)
+    if not os.path.exists(path):
+        bill = Bill.query.options(selectinload(Bill.items)).filter_by(bill_number=bill_number).first() \
+            or load_archived_bill(bill_number)
+        if bill is None:
+            return None
+        from bill_render import render_bill
+        data = render_bill(bill, fmt, footer_image_path=get_footer_image_path())
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        if fmt == 'pdf' and bill.pdf_path != filename and not getattr(bill, 'archived', False):
+            bill.pdf_path = filename
+            db.session.commit()
+    return filename
+
+@jobs.job_handler('render_bill')
+def render_bill_job(payload):
+    if ensure_rendered_bill(payload['bill_number'], 'pdf'):
+        jobs.enqueue('upload_bill', {'bill_number': payload['bill_number']})
+        db.session.commit()
+
+@jobs.job_handler('upload_bill')
+def upload_bill_job(payload):
+    filename = ensure_rendered_bill(payload['bill_number'], 'pdf')
+    if filename:
+        path = os.path.join(app.config['BILL_RENDER_FOLDER'], filename)
+        with open(path, 'rb') as f:
+            get_storage_bucket().upload(f"{BILL_BUCKET_PREFIX}/{filename}", f.read(),
+                                        {'content-type': 'application/pdf', 'upsert': 'true'})
+
+@app.route('/bill/<bill_number>.<any(pdf, png):fmt>')
+@login_required
+def download_bill(bill_number, fmt):
+    filename = ensure_rendered_bill(bill_number, fmt)
+    if filename is None:
+        return f"Bill not found: {bill_number}", 404
+    response = send_from_directory(app.config['BILL_RENDER_FOLDER'], filename,
+                                   as_attachment=request.args.get('download') == '1')
+    response.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+    return response
+
+def parse_bill_date_range():
+    """(start, end) datetimes from ?from=&to= (YYYY-MM-DD, inclusive days); end is exclusive"""
+    date_from = request.args.get('from', '').strip()
+    date_to = request.args.get('to', '').strip()
+    start = datetime.strptime(date_from, '%Y-%m-%d') if date_from else None
+    end = datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1) if date_to else None
+    return start, end
+
 @app.route('/history')
 @login_required
+@query_budget(4)
 def history():
     try:
-        bills = Bill.query.order_by(Bill.date.desc()).all()
-        return render_template('history.html', bills=bills)
+        from sqlalchemy import and_, or_
+
+        date_from = request.args.get('from', '').strip()
+        date_to = request.args.get('to', '').strip()
+        location = request.args.get('location', '').strip()
+        cursor = request.args.get('cursor', '').strip()
+
+        query = Bill.query
+        try:
+            start, end = parse_bill_date_range()
+        except ValueError:
+            flash('Invalid date filter, expected YYYY-MM-DD')
+            return redirect(url_for('history'))
+        if start is not None:
+            query = query.filter(Bill.date >= start)
+        if end is not None:
+            query = query.filter(Bill.date < end)
+        if location:
+            query = query.filter(Bill.location.ilike(f'%{location}%'))
+
+        # Keyset pagination: continue strictly after the last (date, id) of the previous page
+        cursor_date, cursor_id = decode_history_cursor(cursor)
+        if cursor_date is not None:
+            query = query.filter(or_(
+                Bill.date < cursor_date,
+                and_(Bill.date == cursor_date, Bill.id < cursor_id)
+            ))
+
+        rows = query.order_by(Bill.date.desc(), Bill.id.desc()).limit(HISTORY_PAGE_SIZE + 1).all()
+        bills = rows[:HISTORY_PAGE_SIZE]
+        next_cursor = encode_history_cursor(bills[-1]) if len(rows) > HISTORY_PAGE_SIZE else None
+
+        filters = {'from': date_from, 'to': date_to, 'location': location}
+        active_filters = {k: v for k, v in filters.items() if v}
+        return render_template('history.html', bills=bills, next_cursor=next_cursor,
+                               filters=filters, active_filters=active_filters, is_first_page=not cursor)
     except Exception as e:
         print(f" * Error in history route: {e}")
         return redirect(url_for('index'))
@@ -543,9 +1529,17 @@ def history():
 def clear_history():
     try:
         # Delete all bill items first due to foreign key constraints if any (though cascade="all, delete-orphan" handles it)
+        uploaded = [number for number, in db.session.query(Bill.bill_number).filter(Bill.pdf_path.isnot(None))]
         db.session.query(BillItem).delete()
         db.session.query(Bill).delete()
+        # Archived bills stay viewable, so they stay in reports and search as well
+        reports.clear_sales_summary(keep_archived=True)
+        search.clear_search_index(keep_archived=True)
+        # Other workers drop their cached bill pages on the version change
+        bump_cache_version('bill_pages')
         db.session.commit()
+        discard_cached_bill_pages()
+        discard_rendered_bills(uploaded, clear_folder=True)
         flash('Bill history cleared successfully')
     except Exception as e:
         db.session.rollback()
@@ -557,8 +1551,14 @@ def clear_history():
 def delete_bill(bill_id):
     bill = Bill.query.get_or_404(bill_id)
     try:
+        bill_number = bill.bill_number
+        reports.apply_sales_summary([(bill, bill.items)], sign=-1)
+        search.remove_bills([bill.id])
         db.session.delete(bill)
+        bump_cache_version('bill_pages')
         db.session.commit()
+        discard_rendered_bills([bill_number])
+        discard_cached_bill_pages(bill_number)
         flash('Bill deleted successfully')
     except Exception as e:
         db.session.rollback()
@@ -572,6 +1572,7 @@ def delete_item(item_id):
     item_name = item.name
     try:
         db.session.delete(item)
+        bump_cache_version('catalog')
         db.session.commit()
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest' or request.is_json:
             return jsonify({'status': 'success', 'message': f'Item "{item_name}" deleted successfully'})
@@ -583,6 +1584,8 @@ def delete_item(item_id):
         flash(f'Error deleting item: {str(e)}')
     return redirect(url_for('settings'))
 
+SETTINGS_ITEMS_PER_PAGE = 50
+
 @app.route('/settings', methods=['GET', 'POST'])
 @login_required
 def settings():
@@ -595,19 +1598,32 @@ def settings():
             db.session.add(settings)
             db.session.commit()
         
-        items = Item.query.all()
+        q = request.args.get('q', '').strip()
+        page = max(request.args.get('page', 1, type=int), 1)
         if request.method == 'POST':
             settings.company_name = request.form.get('company_name')
             settings.shop_name = request.form.get('shop_name')
             settings.address = request.form.get('address')
             settings.mobile = request.form.get('mobile')
             settings.mobile2 = request.form.get('mobile2')
-            
+
+            # Payment QR code: stored as deduplicated, metadata-free variants
+            qr_file = request.files.get('qr_code')
+            if qr_file and qr_file.filename:
+                if not allowed_file(qr_file.filename):
+                    flash('QR code must be a PNG, JPG or GIF image.')
+                else:
+                    try:
+                        settings.qr_code_path = save_image_upload(qr_file, 'qr_codes')
+                    except ValueError as e:
+                        flash(f'Could not use the QR code image: {e}')
+
             # Add new item if provided
             new_item_name = request.form.get('new_item_name')
             new_item_price = request.form.get('new_item_price')
             new_item_category = request.form.get('new_item_category', 'Main')
             is_sub_item = request.form.get('is_sub_item') == 'on'
+            catalog_changed = False
 
             if new_item_name and new_item_price:
                 existing_item = Item.query.filter_by(name=new_item_name).first()
@@ -619,14 +1635,20 @@ def settings():
                         is_flavor=is_sub_item
                     )
                     db.session.add(new_item)
+                    catalog_changed = True
                 else:
                     flash(f'Item "{new_item_name}" already exists.')
             
-            # Update prices
-            for item in items:
-                new_price = request.form.get(f'price_{item.id}')
-                if new_price:
-                    item.price = float(new_price)
+            # Update prices: the page only posts its own items, and only the changed ones are written
+            submitted_prices = {}
+            for key, value in request.form.items():
+                if key.startswith('price_') and value:
+                    try:
+                        submitted_prices[int(key[len('price_'):])] = float(value)
+                    except ValueError:
+                        flash(f'Ignored invalid price "{value}".')
+            if catalog.apply_price_changes(submitted_prices):
+                catalog_changed = True
             
             # Account Management
             new_username = request.form.get('new_username')
@@ -634,7 +1656,14 @@ def settings():
             new_password = request.form.get('new_password')
             
             if (new_username and new_username != current_user.username) or new_password:
-                if not current_password or not check_password_hash(current_user.password, current_password):
+                try:
+                    matches = bool(current_password) and password_hasher.verify(current_user.password, current_password)[0]
+                    new_password_hash = password_hasher.hash(new_password) if matches and new_password else None
+                except (passwords.HashingBusy, passwords.HashingFailed):
+                    db.session.rollback()
+                    flash('The server is busy. Please try again in a moment.')
+                    return redirect(url_for('settings'))
+                if not matches:
                     flash('Current password is required and must be correct to change credentials.')
                     return redirect(url_for('settings'))
                 
@@ -645,16 +1674,20 @@ def settings():
                     else:
                         current_user.username = new_username
                 
-                if new_password:
-                    current_user.password = generate_password_hash(new_password, method='pbkdf2:sha256')
+                if new_password_hash:
+                    current_user.password = new_password_hash
                 
                 flash('Login credentials updated successfully.')
             
             try:
+                if catalog_changed:
+                    bump_cache_version('catalog')
+                bump_cache_version('settings')
                 db.session.commit()
                 db.session.refresh(settings) # Refresh to get latest state
                 
-                # Invalidate cache so changes reflect on next request
+                # Invalidate cache so changes reflect on next request in this worker;
+                # other workers pick up the bumped version within SETTINGS_CACHE_TTL
                 global _cached_settings
                 _cached_settings = None
                 
@@ -662,10 +1695,10 @@ def settings():
             except Exception as e:
                 db.session.rollback()
                 flash(f'Error updating settings: {str(e)}')
-            return redirect(url_for('settings'))
+            return redirect(url_for('settings', q=q or None, page=page if page > 1 else None))
         
-        categories = ['Main', 'Ice Cream', 'Fruits', 'Beeda', 'Welcome Drinks']
-        return render_template('settings.html', settings=settings, items=items, categories=categories)
+        items, has_next = catalog.item_page(q, page, SETTINGS_ITEMS_PER_PAGE)
+        return render_template('settings.html', settings=settings, items=items, q=q, page=page, has_next=has_next)
     except Exception as e:
         print(f" * Error in settings route: {e}")
         return redirect(url_for('index'))
@@ -686,6 +1719,7 @@ def update_item_description():
             return jsonify({'status': 'error', 'message': 'Item not found'}), 404
             
         item.description = description
+        bump_cache_version('catalog')
         db.session.commit()
         
         return jsonify({'status': 'success', 'message': f'Description updated for {item.name}'})
@@ -694,6 +1728,164 @@ def update_item_description():
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 
+@app.route('/search')
+@login_required
+@query_budget(5)
+def search_bills():
+    q = request.args.get('q', '').strip()
+    wants_json = request.args.get('format') == 'json'
+    try:
+        start, end = parse_bill_date_range()
+        page = max(int(request.args.get('page', 1)), 1)
+    except ValueError:
+        if wants_json:
+            return jsonify({'status': 'error', 'message': 'Invalid date or page'}), 400
+        flash('Invalid date filter, expected YYYY-MM-DD')
+        return redirect(url_for('search_bills', q=q))
+    results, has_next = search.search_bills(q, start, end, page)
+    if wants_json:
+        return jsonify({
+            'query': q,
+            'page': page,
+            'has_next': has_next,
+            'results': [{
+                'bill_number': bill.bill_number,
+                'date': bill.date.isoformat() if bill.date else None,
+                'location': bill.location,
+                'party_number': bill.party_number,
+                'grand_total': bill.grand_total,
+                'score': round(score, 4)
+            } for bill, score in results]
+        })
+    filters = {'q': q, 'from': request.args.get('from', '').strip(), 'to': request.args.get('to', '').strip()}
+    active_filters = {k: v for k, v in filters.items() if v}
+    return render_template('search.html', results=results, page=page, has_next=has_next,
+                           filters=filters, active_filters=active_filters)
+
+def parse_report_dates():
+    today = get_now().date()
+    date_from = datetime.strptime(request.args['from'], '%Y-%m-%d').date() if request.args.get('from') else today.replace(day=1)
+    date_to = datetime.strptime(request.args['to'], '%Y-%m-%d').date() if request.args.get('to') else today
+    return date_from, date_to
+
+@app.route('/reports')
+@login_required
+@query_budget(8)
+def sales_reports():
+    try:
+        date_from, date_to = parse_report_dates()
+    except ValueError:
+        if request.args.get('format') == 'json':
+            return jsonify({'status': 'error', 'message': 'Invalid date, expected YYYY-MM-DD'}), 400
+        flash('Invalid date filter, expected YYYY-MM-DD')
+        return redirect(url_for('sales_reports'))
+    group = 'month' if request.args.get('group') == 'month' else 'day'
+    report = reports.sales_report(date_from, date_to, request.args.get('location', '').strip(), group)
+    if request.args.get('format') == 'json':
+        return jsonify(report)
+    return render_template('reports.html', report=report)
+
+def export_response(chunks, mimetype, filename):
+    """Stream an export, gzip-encoded when the client accepts it"""
+    headers = {'Content-Disposition': f'attachment; filename={filename}', 'Vary': 'Accept-Encoding'}
+    if 'gzip' in request.headers.get('Accept-Encoding', '').lower():
+        headers['Content-Encoding'] = 'gzip'
+        chunks = exports.gzip_stream(chunks)
+    return Response(stream_with_context(chunks), mimetype=mimetype, headers=headers)
+
+@app.route('/export/catalog.<fmt>')
+@login_required
+def export_catalog(fmt):
+    if fmt == 'csv':
+        return export_response(catalog.catalog_csv(), 'text/csv', 'catalog.csv')
+    if fmt == 'json':
+        return export_response(catalog.catalog_json(), 'application/json', 'catalog.json')
+    abort(404)
+
+@app.route('/import/catalog', methods=['POST'])
+@login_required
+def import_catalog():
+    """Upsert items by name from an uploaded CSV/JSON file (settings page) or a CSV/JSON request body"""
+    upload = request.files.get('catalog_file')
+    from_form = upload is not None
+    try:
+        if from_form:
+            fmt = 'csv' if upload.filename.lower().endswith('.csv') else 'json'
+            data = upload.read().decode('utf-8-sig')
+        else:
+            fmt = 'csv' if request.mimetype == 'text/csv' else 'json'
+            data = request.get_data(as_text=True)
+        rows = catalog.parse_catalog(data, fmt)
+        created, updated = catalog.import_catalog(rows)
+        if rows:
+            bump_cache_version('catalog')
+        db.session.commit()
+        message = f'Catalog imported: {created} new, {updated} updated'
+        print(f" * {message}")
+        if from_form:
+            flash(message)
+            return redirect(url_for('settings'))
+        return jsonify({'status': 'success', 'created': created, 'updated': updated})
+    except (ValueError, UnicodeDecodeError) as e:
+        db.session.rollback()
+        if from_form:
+            flash(f'Catalog import failed: {e}')
+            return redirect(url_for('settings'))
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        print(f" * Error in import_catalog route: {e}")
+        if from_form:
+            flash(f'Catalog import failed: {e}')
+            return redirect(url_for('settings'))
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/export/bills.csv')
+@login_required
+def export_bills_csv():
+    try:
+        start, end = parse_bill_date_range()
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Invalid date, expected YYYY-MM-DD'}), 400
+    chunks = exports.bills_csv(start, end, request.args.get('location', '').strip(),
+                               archived=archive.iter_archived_bills(get_storage_bucket(), start, end))
+    return export_response(chunks, 'text/csv', 'bills.csv')
+
+@app.route('/export/bill_items.jsonl')
+@login_required
+def export_bill_items_jsonl():
+    try:
+        start, end = parse_bill_date_range()
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Invalid date, expected YYYY-MM-DD'}), 400
+    chunks = exports.bill_items_jsonl(start, end, request.args.get('location', '').strip(),
+                                      archived=archive.iter_archived_bills(get_storage_bucket(), start, end))
+    return export_response(chunks, 'application/x-ndjson', 'bill_items.jsonl')
+
+@app.route('/jobs')
+@login_required
+def list_jobs():
+    query = Job.query
+    status = request.args.get('status')
+    if status:
+        query = query.filter_by(status=status)
+    recent = query.order_by(Job.id.desc()).limit(min(request.args.get('limit', 50, type=int), 500)).all()
+    return jsonify({
+        'stats': jobs.job_stats(),
+        'workers': len(_job_pool.threads) if _job_pool else 0,
+        'jobs': [jobs.job_to_dict(job) for job in recent]
+    })
+
+@app.route('/jobs/<int:job_id>/retry', methods=['POST'])
+@login_required
+def retry_job(job_id):
+    job = Job.query.get_or_404(job_id)
+    job.status = 'pending'
+    job.attempts = 0
+    job.run_after = jobs.utcnow()
+    db.session.commit()
+    return jsonify({'status': 'success', 'job': jobs.job_to_dict(job)})
+
 @app.errorhandler(500)
 def handle_500(e):
     # Try to extract the original exception if possible
@@ -714,24 +1906,36 @@ def db_test():
 
 # Run initialization once
 _initialized = False
+_job_pool = None
+_job_pool_started = False
+_init_lock = threading.Lock()
 @app.before_request
 def safe_init():
-    global _initialized
-    if not _initialized:
-        try:
-            seed_data()
-            # Run migrations even if already initialized, to catch up missing columns
-            # (try_alter handles 'already exists' gracefully)
-            run_migrations()
-            _initialized = True
-        except Exception as e:
-            print(f"Lazy initialization error: {e}")
+    global _initialized, _job_pool, _job_pool_started
+    if _initialized and _job_pool_started:
+        return
+    # Concurrent first requests wait here, so migrations run and the job pool starts once
+    with _init_lock:
+        if not _initialized:
+            try:
+                # One version query on a warm database; migrations only run when behind
+                version = get_schema_version()
+                if version < LATEST_SCHEMA_VERSION:
+                    for result in run_migrations():
+                        print(f" * Migration: {result}")
+                    version = get_schema_version()
+                _initialized = version >= LATEST_SCHEMA_VERSION
+            except Exception as e:
+                print(f"Lazy initialization error: {e}")
+        if _initialized and not _job_pool_started:
+            if app.config['JOB_WORKERS'] > 0:
+                _job_pool = jobs.JobWorkerPool(app, app.config['JOB_WORKERS']).start()
+            _job_pool_started = True
     
     # If it failed, maybe we should try again later? 
     # For now, let's just log it.
 
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
-        seed_data()
+        run_migrations()
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,171 @@
+"""Durable background jobs for work that should not run on the request path.
+
+Jobs are rows in the `job` table, so enqueueing inside a request commits
+atomically with the data they refer to. Worker threads (or a standalone
+`python jobs.py` process) claim due jobs, run the registered handler and retry
+failures with exponential backoff.
+"""
+import json
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import update, or_, and_, func
+from models import db, Job
+
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 1.0))
+JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', 300))
+JOB_BACKOFF_BASE = float(os.environ.get('JOB_BACKOFF_BASE', 5.0))
+JOB_BACKOFF_MAX = float(os.environ.get('JOB_BACKOFF_MAX', 3600.0))
+
+_handlers = {}
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def job_handler(kind):
+    """Register a function(payload_dict) as the handler for jobs of `kind`"""
+    def decorator(func):
+        _handlers[kind] = func
+        return func
+    return decorator
+
+def enqueue(kind, payload=None, delay=0, max_attempts=5):
+    """Add a job to the current session; it becomes visible to workers when the caller commits"""
+    job = Job(
+        kind=kind,
+        payload=json.dumps(payload or {}),
+        status='pending',
+        max_attempts=max_attempts,
+        run_after=utcnow() + timedelta(seconds=delay)
+    )
+    db.session.add(job)
+    return job
+
+def backoff_seconds(attempts):
+    return min(JOB_BACKOFF_BASE * (2 ** max(attempts - 1, 0)), JOB_BACKOFF_MAX)
+
+def _due_filter(now):
+    # Pending jobs whose time has come, plus running jobs whose worker died mid-lease
+    return or_(
+        and_(Job.status == 'pending', Job.run_after <= now),
+        and_(Job.status == 'running', Job.updated_at < now - timedelta(seconds=JOB_LEASE_SECONDS))
+    )
+
+def claim_job(worker_id):
+    """Atomically move one due job to 'running' and return it, or None"""
+    now = utcnow()
+    candidates = db.session.query(Job.id).filter(_due_filter(now)).order_by(Job.run_after, Job.id).limit(5).all()
+    for (job_id,) in candidates:
+        claimed = db.session.execute(
+            update(Job)
+            .where(Job.id == job_id, _due_filter(now))
+            .values(status='running', locked_by=worker_id, attempts=Job.attempts + 1, updated_at=now)
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return db.session.get(Job, job_id)
+    return None
+
+def run_job(job):
+    handler = _handlers.get(job.kind)
+    try:
+        if handler is None:
+            raise LookupError(f"No handler registered for job kind '{job.kind}'")
+        handler(json.loads(job.payload or '{}'))
+        job.status = 'done'
+        job.last_error = None
+    except Exception as e:
+        db.session.rollback()
+        job = db.session.get(Job, job.id)
+        job.last_error = f"{type(e).__name__}: {e}"[:1000]
+        if job.attempts >= job.max_attempts:
+            job.status = 'failed'
+            print(f" * Job {job.id} ({job.kind}) failed permanently: {job.last_error}")
+        else:
+            job.status = 'pending'
+            job.run_after = utcnow() + timedelta(seconds=backoff_seconds(job.attempts))
+            print(f" * Job {job.id} ({job.kind}) attempt {job.attempts} failed, retrying: {job.last_error}")
+    job.locked_by = None
+    job.updated_at = utcnow()
+    db.session.commit()
+    return job.status
+
+def run_pending_jobs(worker_id=None, limit=None):
+    """Run due jobs until the queue is empty (or `limit` jobs ran); returns the number run"""
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    count = 0
+    while limit is None or count < limit:
+        job = claim_job(worker_id)
+        if job is None:
+            break
+        run_job(job)
+        count += 1
+    return count
+
+def job_stats():
+    counts = dict(db.session.query(Job.status, func.count(Job.id)).group_by(Job.status).all())
+    return {status: counts.get(status, 0) for status in ('pending', 'running', 'done', 'failed')}
+
+def job_to_dict(job):
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'payload': json.loads(job.payload or '{}'),
+        'status': job.status,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'run_after': job.run_after.isoformat() if job.run_after else None,
+        'last_error': job.last_error,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'updated_at': job.updated_at.isoformat() if job.updated_at else None
+    }
+
+class JobWorkerPool:
+    """Daemon threads polling the job table inside the app context"""
+
+    def __init__(self, app, size):
+        self.app = app
+        self.size = size
+        self.threads = []
+        self.stopping = threading.Event()
+
+    def _loop(self, index):
+        worker_id = f"{socket.gethostname()}:{os.getpid()}:{index}"
+        while not self.stopping.is_set():
+            ran = 0
+            try:
+                with self.app.app_context():
+                    ran = run_pending_jobs(worker_id, limit=20)
+            except Exception:
+                traceback.print_exc()
+            if not ran:
+                self.stopping.wait(JOB_POLL_INTERVAL)
+
+    def start(self):
+        for index in range(self.size):
+            thread = threading.Thread(target=self._loop, args=(index,), name=f"job-worker-{index}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def stop(self, timeout=5):
+        self.stopping.set()
+        for thread in self.threads:
+            thread.join(timeout)
+
+if __name__ == '__main__':
+    # Standalone worker, e.g. for deployments where request processes can't run threads
+    import sys
+    from index import app
+    import jobs
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 2
+    print(f" * Starting {size} job workers")
+    pool = jobs.JobWorkerPool(app, size).start()
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        pool.stop()
@@ -0,0 +1,126 @@
+"""In-process request metrics in the Prometheus text format.
+
+Each worker process keeps its own counters and histograms; Prometheus sums them
+when it scrapes every instance. Per-request phase timings (SQL, template
+rendering, storage) are collected on `flask.g` and end up both in the histograms
+and in the response's Server-Timing header.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from flask import g, has_request_context
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+PHASES = ('db', 'render', 'storage')
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{_labels(labels, le=_number(bound))} {cumulative}'
+        yield f'{name}_bucket{_labels(labels, le="+Inf")} {self.count}'
+        yield f'{name}_sum{_labels(labels)} {_number(self.sum)}'
+        yield f'{name}_count{_labels(labels)} {self.count}'
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+class RequestMetrics:
+    """Per-endpoint request counts, latency, SQL and phase histograms"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = {}          # (endpoint, method, status) -> count
+        self.latency = {}           # endpoint -> Histogram (seconds)
+        self.queries = {}           # endpoint -> Histogram (statements per request)
+        self.phase_seconds = {}     # (endpoint, phase) -> Histogram (seconds)
+        self.started = time.time()
+
+    def record(self, endpoint, method, status, seconds, query_count, phases):
+        with self.lock:
+            key = (endpoint, method, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.latency.setdefault(endpoint, Histogram(LATENCY_BUCKETS)).observe(seconds)
+            self.queries.setdefault(endpoint, Histogram(QUERY_COUNT_BUCKETS)).observe(query_count)
+            for phase, phase_seconds in phases.items():
+                self.phase_seconds.setdefault((endpoint, phase), Histogram(LATENCY_BUCKETS)).observe(phase_seconds)
+
+    def render(self, extra=()):
+        """Prometheus exposition text; `extra` holds more (name, type, help, [(labels, value)]) families"""
+        out = []
+        with self.lock:
+            out += ['# HELP billing_http_requests_total Requests handled, by endpoint, method and status.',
+                    '# TYPE billing_http_requests_total counter']
+            for (endpoint, method, status), count in sorted(self.requests.items()):
+                out.append(f'billing_http_requests_total'
+                           f'{_labels([("endpoint", endpoint), ("method", method), ("status", status)])} {count}')
+            out += ['# HELP billing_http_request_duration_seconds Request latency, by endpoint.',
+                    '# TYPE billing_http_request_duration_seconds histogram']
+            for endpoint, histogram in sorted(self.latency.items()):
+                out += histogram.lines('billing_http_request_duration_seconds', [('endpoint', endpoint)])
+            out += ['# HELP billing_sql_queries_per_request SQL statements issued per request, by endpoint.',
+                    '# TYPE billing_sql_queries_per_request histogram']
+            for endpoint, histogram in sorted(self.queries.items()):
+                out += histogram.lines('billing_sql_queries_per_request', [('endpoint', endpoint)])
+            out += ['# HELP billing_request_phase_seconds Time per request spent in SQL (db), templates (render) '
+                    'and bucket storage (storage), by endpoint.',
+                    '# TYPE billing_request_phase_seconds histogram']
+            for (endpoint, phase), histogram in sorted(self.phase_seconds.items()):
+                out += histogram.lines('billing_request_phase_seconds', [('endpoint', endpoint), ('phase', phase)])
+        out += ['# HELP billing_process_start_time_seconds Start time of this worker process.',
+                '# TYPE billing_process_start_time_seconds gauge',
+                f'billing_process_start_time_seconds {_number(self.started)}']
+        for name, metric_type, help_text, samples in extra:
+            out += [f'# HELP {name} {help_text}', f'# TYPE {name} {metric_type}']
+            for labels, value in samples:
+                out.append(f'{name}{_labels(labels)} {_number(value)}')
+        return '\n'.join(out) + '\n'
+
+def start_request():
+    g.request_started = time.perf_counter()
+    g.phase_seconds = {}
+
+def add_phase_time(phase, seconds):
+    if has_request_context() and 'phase_seconds' in g:
+        g.phase_seconds[phase] = g.phase_seconds.get(phase, 0.0) + seconds
+
+@contextmanager
+def timed(phase):
+    """Attribute the enclosed block's time to a request phase (e.g. 'storage')"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_phase_time(phase, time.perf_counter() - start)
+
+def server_timing(total_seconds, query_count, phases):
+    parts = []
+    for phase in PHASES:
+        if phase in phases:
+            desc = f';desc="{query_count} queries"' if phase == 'db' else ''
+            parts.append(f'{phase}{desc};dur={phases[phase] * 1000:.1f}')
+    parts.append(f'app;dur={total_seconds * 1000:.1f}')
+    return ', '.join(parts)
@@ -0,0 +1,19 @@
+import sys
+from index import app, get_schema_version, run_migrations, LATEST_SCHEMA_VERSION
+
+def migrate():
+    """Apply pending schema migrations ahead of a deploy"""
+    with app.app_context():
+        current = get_schema_version()
+        print(f"Schema version: {current} (latest: {LATEST_SCHEMA_VERSION})")
+        if '--check' in sys.argv:
+            sys.exit(0 if current >= LATEST_SCHEMA_VERSION else 1)
+        for result in run_migrations():
+            print(f" - {result}")
+        current = get_schema_version()
+        print(f"Schema version now: {current}")
+        if current < LATEST_SCHEMA_VERSION:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    migrate()
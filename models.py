@@ -36,6 +36,10 @@ class Item(db.Model):
     is_flavor = db.Column(db.Boolean, default=False) # For Ice Cream flavors
     description = db.Column(db.String(500))
 
+    __table_args__ = (
+        db.Index('ix_item_category_is_flavor', 'category', 'is_flavor'),
+    )
+
 def get_ist_now():
     return datetime.utcnow() + timedelta(hours=5, minutes=30)
 
@@ -56,11 +60,106 @@ class Bill(db.Model):
     party_number = db.Column(db.String(50))
     pdf_path = db.Column(db.String(255))
     qr_code_path = db.Column(db.String(255))  # Snapshot of QR code at time of billing
+    idempotency_key = db.Column(db.String(64), unique=True, index=True)  # Client-generated, dedupes retried submissions
     items = db.relationship('BillItem', backref='bill', lazy=True, cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Keyset pagination on history walks (date, id) in descending order
+        db.Index('ix_bill_date_id', 'date', 'id'),
+        # Ids are never reused on SQLite either: archived bills and search rows keep them
+        {'sqlite_autoincrement': True},
+    )
+
+class BillCounter(db.Model):
+    # Per-day bill number counter; workers reserve blocks of numbers from it
+    day = db.Column(db.String(8), primary_key=True)  # YYYYMMDD (IST)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+class SchemaVersion(db.Model):
+    # One row per applied migration step (see MIGRATIONS in index.py)
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    name = db.Column(db.String(100))
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class CacheVersion(db.Model):
+    # Monotonic version counters shared by all workers to invalidate in-process caches
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class Job(db.Model):
+    # Durable background job (see jobs.py)
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text)  # JSON
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_after = db.Column(db.DateTime, default=datetime.utcnow)
+    locked_by = db.Column(db.String(100))
+    last_error = db.Column(db.String(1000))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_job_status_run_after', 'status', 'run_after'),
+    )
+
+class DailySalesSummary(db.Model):
+    # Per day/location/item sales totals, maintained alongside bill writes (see reports.py).
+    # Rows with item_name '' hold whole-bill totals.
+    __tablename__ = 'daily_sales_summary'
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    location = db.Column(db.String(150), nullable=False, default='')
+    item_name = db.Column(db.String(100), nullable=False, default='')
+    bill_count = db.Column(db.Integer, nullable=False, default=0)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+    advance_amount = db.Column(db.Float, nullable=False, default=0.0)
+    discount_amount = db.Column(db.Float, nullable=False, default=0.0)
+    balance_amount = db.Column(db.Float, nullable=False, default=0.0)
+
+    __table_args__ = (
+        db.UniqueConstraint('day', 'location', 'item_name', name='uq_daily_sales_summary_key'),
+    )
+
+class ArchivedSalesSummary(db.Model):
+    # The archived bills' share of daily_sales_summary, recorded as they are archived (see
+    # archive.py): their lines are no longer in bill_item for a rebuild to recount.
+    __tablename__ = 'archived_sales_summary'
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    location = db.Column(db.String(150), nullable=False, default='')
+    item_name = db.Column(db.String(100), nullable=False, default='')
+    bill_count = db.Column(db.Integer, nullable=False, default=0)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+    advance_amount = db.Column(db.Float, nullable=False, default=0.0)
+    discount_amount = db.Column(db.Float, nullable=False, default=0.0)
+    balance_amount = db.Column(db.Float, nullable=False, default=0.0)
+
+    __table_args__ = (
+        db.UniqueConstraint('day', 'location', 'item_name', name='uq_archived_sales_summary_key'),
+    )
+
+class ArchivedBill(db.Model):
+    # Index entry for a bill moved to a compressed archive segment (see archive.py).
+    # id is the bill's original id, so search index rows keep pointing at it.
+    __tablename__ = 'archived_bill'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    bill_number = db.Column(db.String(20), unique=True, nullable=False)
+    date = db.Column(db.DateTime, index=True)
+    location = db.Column(db.String(150))
+    party_number = db.Column(db.String(50))
+    grand_total = db.Column(db.Float, nullable=False, default=0.0)
+    segment = db.Column(db.String(255), nullable=False)  # storage path of the .jsonl.gz segment
+    member_offset = db.Column(db.Integer, nullable=False)  # byte range of the gzip member holding the bill
+    member_length = db.Column(db.Integer, nullable=False)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class BillItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    bill_id = db.Column(db.Integer, db.ForeignKey('bill.id'), nullable=False)
+    bill_id = db.Column(db.Integer, db.ForeignKey('bill.id'), nullable=False, index=True)
     item_name = db.Column(db.String(100), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
     unit_price = db.Column(db.Float, nullable=False)
@@ -0,0 +1,183 @@
+"""Password hashing off the request threads, with a concurrency cap and login throttling.
+
+Each hash is deliberately slow (600k PBKDF2 rounds by default). Hashes run in a
+small process pool whose workers run at a lower CPU priority, so a burst of logins
+queues behind a fixed number of cores instead of competing with checkout. At most
+PASSWORD_HASH_MAX_PENDING hashes are running or waiting for a worker at a time;
+past that a caller waits up to a second for a slot and then gets `HashingBusy`.
+If a worker dies (say, to the OOM killer) the pool is replaced and the hash retried
+once; a second failure raises `HashingFailed`.
+On serverless (no usable process pool) PASSWORD_HASH_WORKERS=0 hashes inline,
+under the same cap.
+
+`LoginThrottle` limits failed attempts per client IP and per username within a
+sliding window, before any hashing happens. Successful logins are not counted, so
+terminals sharing one NAT address are only held back by wrong passwords. Its counts
+are per process.
+"""
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures.process import BrokenProcessPool
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+
+# Method (and cost) for new hashes; older hashes are upgraded to it on the next successful login
+PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', f'pbkdf2:sha256:{DEFAULT_PBKDF2_ITERATIONS}')
+PASSWORD_HASH_NICE = int(os.environ.get('PASSWORD_HASH_NICE', 10))
+SCRYPT_DEFAULTS = ('32768', '8', '1')
+
+class HashingBusy(Exception):
+    """Too many password hashes already running or queued"""
+
+class HashingFailed(Exception):
+    """The hashing pool broke and a fresh pool failed as well"""
+
+def _normalized_method(method):
+    """The method prefix werkzeug writes into a hash, with its default cost filled in"""
+    parts = method.split(':')
+    if parts[0] == 'pbkdf2':
+        return ':'.join(['pbkdf2', parts[1] if len(parts) > 1 else 'sha256',
+                         parts[2] if len(parts) > 2 else str(DEFAULT_PBKDF2_ITERATIONS)])
+    if parts[0] == 'scrypt':
+        return ':'.join(['scrypt'] + parts[1:] + list(SCRYPT_DEFAULTS[len(parts) - 1:]))
+    return method
+
+def needs_rehash(password_hash):
+    return password_hash.split('$', 1)[0] != _normalized_method(PASSWORD_HASH_METHOD)
+
+def _init_worker(parent_pid):
+    try:
+        os.nice(PASSWORD_HASH_NICE)
+    except (AttributeError, OSError):
+        pass
+
+    # A worker blocked on its task queue never notices its parent was killed; exit with it
+    def watch_parent():
+        while os.getppid() == parent_pid:
+            time.sleep(1)
+        os._exit(0)
+    threading.Thread(target=watch_parent, daemon=True).start()
+
+def _verify_and_upgrade(password_hash, password):
+    """(matches, new hash or None): runs in a pool worker"""
+    if not check_password_hash(password_hash, password):
+        return False, None
+    if needs_rehash(password_hash):
+        return True, generate_password_hash(password, method=PASSWORD_HASH_METHOD)
+    return True, None
+
+def _hash(password):
+    return generate_password_hash(password, method=PASSWORD_HASH_METHOD)
+
+class PasswordHasher:
+    def __init__(self, workers, max_pending, wait_seconds=1.0):
+        self.workers = workers
+        self.wait_seconds = wait_seconds
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.lock = threading.Lock()
+        self.pool = None
+        self.running = 0
+        self.rejected = 0
+        self.completed = 0
+
+    def _get_pool(self):
+        with self.lock:
+            if self.pool is None:
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+                # spawn: forking a process that runs request and job threads is unsafe. Workers
+                # re-import the main module, so scripts that start the app keep a __main__ guard
+                self.pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                                initializer=_init_worker, initargs=(os.getpid(),))
+            return self.pool
+
+    def _discard_pool(self, pool):
+        with self.lock:
+            if self.pool is pool:
+                self.pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, fn, *args):
+        if not self.slots.acquire(timeout=self.wait_seconds):
+            with self.lock:
+                self.rejected += 1
+            raise HashingBusy()
+        with self.lock:
+            self.running += 1
+        try:
+            if self.workers <= 0:
+                return fn(*args)
+            for _ in range(2):
+                pool = self._get_pool()
+                try:
+                    return pool.submit(fn, *args).result()
+                except BrokenProcessPool as e:
+                    # A dead worker breaks the whole pool for good; replace it and retry once
+                    print(f" * Password hashing pool broke ({e}), starting a new one")
+                    self._discard_pool(pool)
+                    error = e
+            raise HashingFailed() from error
+        finally:
+            with self.lock:
+                self.running -= 1
+                self.completed += 1
+            self.slots.release()
+
+    def verify(self, password_hash, password):
+        """(matches, upgraded hash or None); raises HashingBusy or HashingFailed"""
+        return self._run(_verify_and_upgrade, password_hash, password)
+
+    def hash(self, password):
+        """A new hash with the configured method; raises HashingBusy or HashingFailed"""
+        return self._run(_hash, password)
+
+    def stats(self):
+        with self.lock:
+            return {'workers': self.workers, 'running': self.running,
+                    'completed': self.completed, 'rejected': self.rejected}
+
+class LoginThrottle:
+    """Sliding-window limits on failed attempts, per client IP and per username"""
+
+    def __init__(self, ip_failures, user_failures, window_seconds):
+        self.ip_failures = ip_failures
+        self.user_failures = user_failures
+        self.window = window_seconds
+        self.lock = threading.Lock()
+        self.events = {}  # key -> deque of failure timestamps
+
+    def _recent(self, key, now):
+        events = self.events.get(key)
+        if events is None:
+            return None
+        while events and events[0] <= now - self.window:
+            events.popleft()
+        if not events:
+            del self.events[key]
+            return None
+        return events
+
+    def check(self, ip, username):
+        """Seconds to wait if the IP or username is over its failure limit, else 0"""
+        now = time.monotonic()
+        with self.lock:
+            if len(self.events) > 10000:
+                for key in list(self.events):
+                    self._recent(key, now)
+            for key, limit in ((('user', username), self.user_failures), (('ip', ip), self.ip_failures)):
+                events = self._recent(key, now)
+                if events is not None and len(events) >= limit:
+                    return int(events[0] + self.window - now) + 1
+            return 0
+
+    def failed(self, ip, username=None):
+        now = time.monotonic()
+        with self.lock:
+            self.events.setdefault(('ip', ip), deque()).append(now)
+            if username is not None:
+                self.events.setdefault(('user', username), deque()).append(now)
+
+    def succeeded(self, username):
+        with self.lock:
+            self.events.pop(('user', username), None)
@@ -0,0 +1,135 @@
+"""Connection pool selection and pool metrics.
+
+The pool is chosen from the database URL:
+
+- `null`: a transaction pooler (pgbouncer, Supabase's pooler on port 6543) already
+  pools server connections, so each request opens and closes its own client
+  connection and nothing idles in a frozen serverless instance.
+- `queue`: a direct Postgres connection keeps a small QueuePool, pre-pinged on
+  checkout and recycled before the server or a NAT drops it.
+- `default`: SQLite keeps SQLAlchemy's default pool settings.
+
+`DB_POOL_MODE=null|queue` overrides the detection.
+"""
+import os
+import threading
+import time
+from urllib.parse import urlsplit, parse_qs
+from sqlalchemy import event
+from sqlalchemy.pool import NullPool, QueuePool
+
+POOLER_PORTS = {6543}
+POOLER_HOST_MARKERS = ('pooler.', 'pgbouncer')
+
+def detect_pool_mode(db_uri):
+    """'null', 'queue' or 'default' for a database URL (before query parameters are stripped)"""
+    override = os.environ.get('DB_POOL_MODE', '').lower()
+    if override in ('null', 'queue'):
+        return override
+    if not db_uri.startswith('postgresql'):
+        return 'default'
+    parts = urlsplit(db_uri)
+    params = {k.lower(): v[-1].lower() for k, v in parse_qs(parts.query).items()}
+    host = (parts.hostname or '').lower()
+    if params.get('pgbouncer') == 'true' or parts.port in POOLER_PORTS or any(m in host for m in POOLER_HOST_MARKERS):
+        return 'null'
+    return 'queue'
+
+def connect_args_for(db_uri, mode):
+    """Driver arguments that keep a transaction pooler happy.
+
+    psycopg2 never creates server-side prepared statements, so it needs nothing.
+    psycopg 3 prepares repeated statements automatically, and a prepared statement
+    can't be relied on when the next transaction may land on another server connection.
+    """
+    if mode == 'null' and db_uri.startswith('postgresql+psycopg:'):
+        return {'prepare_threshold': None}
+    return {}
+
+class PoolMetrics:
+    """Checkout latency and connection counts for one engine's pool"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.checkout_errors = 0
+        self.checkout_seconds = 0.0
+        self.checkout_max_seconds = 0.0
+        self.checked_out = 0
+        self.connects = 0
+        self.invalidations = 0
+
+    def record_checkout(self, seconds, ok=True):
+        with self.lock:
+            if ok:
+                self.checkouts += 1
+                self.checkout_seconds += seconds
+                self.checkout_max_seconds = max(self.checkout_max_seconds, seconds)
+            else:
+                self.checkout_errors += 1
+
+    def adjust(self, name, delta):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + delta)
+
+    def snapshot(self, pool=None):
+        with self.lock:
+            stats = {
+                'checkouts': self.checkouts,
+                'checkout_errors': self.checkout_errors,
+                'checkout_avg_ms': round(self.checkout_seconds / self.checkouts * 1000, 3) if self.checkouts else None,
+                'checkout_max_ms': round(self.checkout_max_seconds * 1000, 3),
+                'checked_out': self.checked_out,
+                'connections_opened': self.connects,
+                'invalidations': self.invalidations
+            }
+        if isinstance(pool, QueuePool):
+            stats.update(pool_size=pool.size(), idle=pool.checkedin(), overflow=pool.overflow())
+        return stats
+
+def timed_pool_class(base, metrics):
+    """A subclass of `base` that records every checkout in `metrics` (kept across pool.recreate())"""
+
+    class TimedPool(base):
+        def connect(self):
+            start = time.perf_counter()
+            try:
+                connection = super().connect()
+            except Exception:
+                metrics.record_checkout(time.perf_counter() - start, ok=False)
+                raise
+            metrics.record_checkout(time.perf_counter() - start)
+            return connection
+
+    TimedPool.__name__ = TimedPool.__qualname__ = f"Timed{base.__name__}"
+    event.listen(TimedPool, 'connect', lambda *args: metrics.adjust('connects', 1))
+    event.listen(TimedPool, 'checkout', lambda *args: metrics.adjust('checked_out', 1))
+    event.listen(TimedPool, 'checkin', lambda *args: metrics.adjust('checked_out', -1))
+    event.listen(TimedPool, 'invalidate', lambda *args: metrics.adjust('invalidations', 1))
+    return TimedPool
+
+def engine_options(db_uri, mode, metrics, serverless=False):
+    """SQLALCHEMY_ENGINE_OPTIONS for the given pool mode"""
+    if mode == 'null':
+        options = {'poolclass': timed_pool_class(NullPool, metrics)}
+    elif mode == 'queue':
+        # A serverless instance serves one request at a time, so a larger pool
+        # only multiplies idle connections across instances
+        options = {
+            'poolclass': timed_pool_class(QueuePool, metrics),
+            'pool_size': int(os.environ.get('DB_POOL_SIZE', 1 if serverless else 5)),
+            'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 2 if serverless else 10)),
+            'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 300)),
+            'pool_pre_ping': True,
+            'pool_use_lifo': True  # reuse the warmest connection; extras age out via pool_recycle
+        }
+    elif ':memory:' in db_uri:
+        return {}
+    else:
+        # SQLite file: SQLAlchemy's default QueuePool, instrumented
+        options = {'poolclass': timed_pool_class(QueuePool, metrics)}
+    connect_args = connect_args_for(db_uri, mode)
+    if connect_args:
+        options['connect_args'] = connect_args
+    return options
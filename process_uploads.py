@@ -0,0 +1,68 @@
+import argparse
+import io
+import os
+from index import app, db, get_supabase, get_storage_bucket, read_cached_upload, save_image_upload, bump_cache_version
+from models import ShopSettings, Bill
+import archive
+import uploads
+
+def read_legacy_upload(reference):
+    local_path = os.path.join(app.config['UPLOAD_FOLDER'], reference)
+    if os.path.exists(local_path):
+        with open(local_path, 'rb') as f:
+            return f.read()
+    if get_supabase():
+        data, _ = read_cached_upload(reference)
+        return data
+    return None
+
+def bill_references():
+    """QR code paths still snapshotted on live or archived bills, whose originals must stay on disk"""
+    references = {path for (path,) in db.session.query(Bill.qr_code_path).distinct()}
+    references |= {bill.qr_code_path for bill in archive.iter_archived_bills(get_storage_bucket())}
+    return references
+
+def main():
+    """Move QR codes uploaded before the upload pipeline onto deduplicated, resized variants"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--delete', action='store_true', help='remove the original local files once converted and no bill references them')
+    args = parser.parse_args()
+
+    with app.app_context():
+        # Bills keep the QR code they were printed with, so only the shop settings move to the new variants
+        references = {path for (path,) in db.session.query(ShopSettings.qr_code_path).distinct()}
+        legacy = sorted(path for path in references if path and not uploads.is_processed(path))
+        print(f"Found {len(legacy)} QR code uploads to convert")
+
+        converted = {}
+        for reference in legacy:
+            data = read_legacy_upload(reference)
+            if not data:
+                print(f" ! {reference}: not found, left as is")
+                continue
+            try:
+                converted[reference] = save_image_upload(io.BytesIO(data), 'qr_codes')
+            except ValueError as e:
+                print(f" ! {reference}: {e}")
+
+        for old, new in converted.items():
+            ShopSettings.query.filter_by(qr_code_path=old).update({'qr_code_path': new}, synchronize_session=False)
+        if converted:
+            # Workers reload their settings snapshot with the new path
+            bump_cache_version('settings')
+        db.session.commit()
+        print(f"Converted {len(converted)} uploads into {len(set(converted.values()))} distinct images")
+
+        if args.delete:
+            in_use = bill_references()
+            for old in converted:
+                if old in in_use:
+                    print(f" * Kept {old}: still referenced by bills")
+                    continue
+                local_path = os.path.join(app.config['UPLOAD_FOLDER'], old)
+                if os.path.exists(local_path):
+                    os.remove(local_path)
+                    print(f" * Removed {local_path}")
+
+if __name__ == '__main__':
+    main()
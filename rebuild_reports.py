@@ -0,0 +1,12 @@
+from index import app, db
+from reports import rebuild_sales_summary
+
+def rebuild():
+    """Recompute daily_sales_summary from the raw bill and bill_item tables (plus archived bills' figures)"""
+    with app.app_context():
+        rows = rebuild_sales_summary()
+        db.session.commit()
+        print(f"Rebuilt daily_sales_summary: {rows} rows")
+
+if __name__ == '__main__':
+    rebuild()
@@ -0,0 +1,185 @@
+"""Incrementally maintained daily sales summary and the report queries over it.
+
+Every saved or deleted bill applies a delta to `daily_sales_summary` in the same
+transaction, one row per (day, location, item). Rows with an empty item_name hold
+whole-bill totals (bill count, revenue, advance, discount, balance), so reports
+never have to scan `bill` or `bill_item`.
+
+Archiving a bill also records its figures in `archived_sales_summary`, so a rebuild
+or a cleared history keeps archived days in the reports.
+"""
+from collections import OrderedDict
+from datetime import date, datetime
+from sqlalchemy import func
+from models import db, Bill, BillItem, DailySalesSummary, ArchivedSalesSummary
+
+BILL_TOTALS = ''  # item_name of the whole-bill totals rows
+COUNTERS = ('bill_count', 'quantity', 'revenue', 'advance_amount', 'discount_amount', 'balance_amount')
+
+def _upsert_statement(model=DailySalesSummary):
+    table = model.__table__
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    stmt = dialect_insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=['day', 'location', 'item_name'],
+        set_={name: table.c[name] + stmt.excluded[name] for name in COUNTERS}
+    )
+
+def _empty_row(day, location, item_name):
+    return {'day': day, 'location': location, 'item_name': item_name,
+            'bill_count': 0, 'quantity': 0, 'revenue': 0.0,
+            'advance_amount': 0.0, 'discount_amount': 0.0, 'balance_amount': 0.0}
+
+def summary_deltas(bills, sign=1):
+    """Aggregate (bill, item_rows) pairs into summary rows; sign=-1 reverses them.
+
+    item_rows are dicts with item_name, quantity and total_price (as inserted into
+    bill_item) or BillItem objects.
+    """
+    rows = OrderedDict()
+
+    def row(day, location, item_name):
+        key = (day, location, item_name)
+        if key not in rows:
+            rows[key] = _empty_row(day, location, item_name)
+        return rows[key]
+
+    for bill, items in bills:
+        day = (bill.date or datetime.now()).date()
+        location = bill.location or ''
+        totals = row(day, location, BILL_TOTALS)
+        totals['bill_count'] += sign
+        totals['revenue'] += sign * (bill.grand_total or 0)
+        totals['advance_amount'] += sign * (bill.advance_amount or 0)
+        totals['discount_amount'] += sign * (bill.discount_amount or 0)
+        totals['balance_amount'] += sign * (bill.balance_amount or 0)
+        for item in items:
+            name, quantity, total = (
+                (item['item_name'], item['quantity'], item['total_price']) if isinstance(item, dict)
+                else (item.item_name, item.quantity, item.total_price)
+            )
+            line = row(day, location, name)
+            line['bill_count'] += sign
+            line['quantity'] += sign * (quantity or 0)
+            line['revenue'] += sign * (total or 0)
+            totals['quantity'] += sign * (quantity or 0)
+    return list(rows.values())
+
+def apply_sales_summary(bills, sign=1):
+    """Add (sign=1) or remove (sign=-1) bills from the summary in the current transaction"""
+    rows = summary_deltas(bills, sign)
+    if not rows:
+        return
+    db.session.execute(_upsert_statement(), rows)
+    if sign < 0:
+        days = {r['day'] for r in rows}
+        DailySalesSummary.query.filter(
+            DailySalesSummary.day.in_(days), DailySalesSummary.bill_count <= 0
+        ).delete(synchronize_session=False)
+
+def archive_sales_summary(bills):
+    """Record archived (bill, items) pairs' figures in the current transaction"""
+    rows = summary_deltas(bills)
+    if rows:
+        db.session.execute(_upsert_statement(ArchivedSalesSummary), rows)
+
+def clear_sales_summary(keep_archived=False):
+    """Empty the summary; keep_archived puts the archived bills' figures back"""
+    DailySalesSummary.query.delete(synchronize_session=False)
+    if keep_archived:
+        rows = [{name: getattr(r, name) for name in ('day', 'location', 'item_name') + COUNTERS}
+                for r in ArchivedSalesSummary.query.all()]
+        if rows:
+            db.session.execute(_upsert_statement(), rows)
+
+def _as_date(value):
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+def rebuild_sales_summary():
+    """Recompute the whole summary from raw bills; returns the number of rows written.
+
+    Live bills are recounted; archived bills' figures come from archived_sales_summary.
+    """
+    clear_sales_summary(keep_archived=True)
+    bill_day = func.date(Bill.date)
+    rows = OrderedDict()
+
+    def row(day, location, item_name):
+        key = (day, location, item_name)
+        if key not in rows:
+            rows[key] = _empty_row(day, location, item_name)
+        return rows[key]
+
+    bill_totals = db.session.query(
+        bill_day, Bill.location, func.count(Bill.id), func.sum(Bill.grand_total),
+        func.sum(Bill.advance_amount), func.sum(Bill.discount_amount), func.sum(Bill.balance_amount)
+    ).group_by(bill_day, Bill.location)
+    for day, location, count, revenue, advance, discount, balance in bill_totals:
+        totals = row(_as_date(day), location or '', BILL_TOTALS)
+        totals['bill_count'] += count
+        totals['revenue'] += revenue or 0
+        totals['advance_amount'] += advance or 0
+        totals['discount_amount'] += discount or 0
+        totals['balance_amount'] += balance or 0
+
+    item_totals = db.session.query(
+        bill_day, Bill.location, BillItem.item_name, func.count(BillItem.id),
+        func.sum(BillItem.quantity), func.sum(BillItem.total_price)
+    ).join(Bill, BillItem.bill_id == Bill.id).group_by(bill_day, Bill.location, BillItem.item_name)
+    for day, location, item_name, count, quantity, revenue in item_totals:
+        day, location = _as_date(day), location or ''
+        line = row(day, location, item_name)
+        line['bill_count'] += count
+        line['quantity'] += quantity or 0
+        line['revenue'] += revenue or 0
+        row(day, location, BILL_TOTALS)['quantity'] += quantity or 0
+
+    if rows:
+        db.session.execute(_upsert_statement(), list(rows.values()))
+    return len(rows)
+
+def sales_report(date_from, date_to, location=None, group='day'):
+    """Totals, a per-day (or per-month) series and per-item figures between two dates (inclusive)"""
+    S = DailySalesSummary
+    dated = S.query.filter(S.day >= date_from, S.day <= date_to)
+    base = dated.filter(S.location == location) if location else dated
+    sums = [func.sum(getattr(S, name)) for name in COUNTERS]
+
+    def to_dict(values):
+        return {name: (int(value or 0) if name in ('bill_count', 'quantity') else round(float(value or 0), 2))
+                for name, value in zip(COUNTERS, values)}
+
+    totals = to_dict(base.filter(S.item_name == BILL_TOTALS).with_entities(*sums).one())
+
+    series = OrderedDict()
+    per_day = base.filter(S.item_name == BILL_TOTALS).with_entities(S.day, *sums).group_by(S.day).order_by(S.day)
+    for day, *values in per_day:
+        day = _as_date(day)
+        key = day.strftime('%Y-%m') if group == 'month' else day.isoformat()
+        entry = series.setdefault(key, to_dict([0] * len(COUNTERS)))
+        for name, value in to_dict(values).items():
+            entry[name] = round(entry[name] + value, 2)
+
+    items = [
+        dict(item_name=name, **to_dict(values))
+        for name, *values in base.filter(S.item_name != BILL_TOTALS)
+        .with_entities(S.item_name, *sums).group_by(S.item_name).order_by(func.sum(S.revenue).desc())
+    ]
+
+    locations = [
+        loc for (loc,) in dated.filter(S.item_name == BILL_TOTALS).with_entities(S.location).distinct().order_by(S.location)
+    ]
+    return {
+        'from': date_from.isoformat(),
+        'to': date_to.isoformat(),
+        'location': location or None,
+        'group': group,
+        'totals': totals,
+        'series': [dict(period=period, **values) for period, values in series.items()],
+        'items': [{k: v for k, v in item.items() if k not in ('advance_amount', 'discount_amount', 'balance_amount')}
+                  for item in items],
+        'locations': locations
+    }
@@ -0,0 +1,159 @@
+"""Full-text search over bills.
+
+One `bill_search` row per bill holds its bill number, party number, location and
+the names/descriptions of its items. On SQLite it is an FTS5 table ranked with
+bm25; on Postgres it is a weighted tsvector behind a GIN index ranked with
+ts_rank. Rows are written and removed in the same transaction as the bill, and
+kept when a bill is archived (see archive.py), so archived bills stay searchable.
+"""
+import re
+from sqlalchemy import text, bindparam, DateTime
+from models import db, Bill, BillItem, ArchivedBill
+
+SEARCH_PAGE_SIZE = 20
+REBUILD_BATCH = 1000
+
+def _is_postgres():
+    return db.engine.dialect.name == 'postgresql'
+
+def create_search_index():
+    if _is_postgres():
+        db.session.execute(text(
+            "CREATE TABLE IF NOT EXISTS bill_search ("
+            " bill_id INTEGER PRIMARY KEY REFERENCES bill(id) ON DELETE CASCADE,"
+            " tsv TSVECTOR NOT NULL)"
+        ))
+        db.session.execute(text("CREATE INDEX IF NOT EXISTS ix_bill_search_tsv ON bill_search USING GIN (tsv)"))
+    else:
+        # rowid is the bill id; bm25 weights follow the column order
+        db.session.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS bill_search USING fts5("
+            "bill_number, party_number, location, items, tokenize='unicode61 remove_diacritics 2')"
+        ))
+
+def _document(bill, items):
+    words = []
+    for item in items:
+        name, description = (
+            (item['item_name'], item.get('item_description')) if isinstance(item, dict)
+            else (item.item_name, item.item_description)
+        )
+        words.append(name or '')
+        if description:
+            words.append(description)
+    return {
+        'bill_id': bill.id,
+        'bill_number': bill.bill_number or '',
+        'party_number': bill.party_number or '',
+        'location': bill.location or '',
+        'items': ' '.join(words)
+    }
+
+def index_bills(bills):
+    """Add (bill, item_rows) pairs to the search index in the current transaction"""
+    documents = [_document(bill, items) for bill, items in bills]
+    if not documents:
+        return
+    if _is_postgres():
+        statement = text(
+            "INSERT INTO bill_search (bill_id, tsv) VALUES (:bill_id,"
+            " setweight(to_tsvector('simple', :bill_number), 'A') ||"
+            " setweight(to_tsvector('simple', :party_number), 'A') ||"
+            " setweight(to_tsvector('simple', :location), 'B') ||"
+            " setweight(to_tsvector('simple', :items), 'C'))"
+            " ON CONFLICT (bill_id) DO UPDATE SET tsv = EXCLUDED.tsv"
+        )
+    else:
+        statement = text(
+            "INSERT OR REPLACE INTO bill_search (rowid, bill_number, party_number, location, items)"
+            " VALUES (:bill_id, :bill_number, :party_number, :location, :items)"
+        )
+    db.session.execute(statement, documents)
+
+def remove_bills(bill_ids):
+    if not bill_ids:
+        return
+    column = 'bill_id' if _is_postgres() else 'rowid'
+    statement = text(f"DELETE FROM bill_search WHERE {column} IN :ids").bindparams(bindparam('ids', expanding=True))
+    db.session.execute(statement, {'ids': list(bill_ids)})
+
+def clear_search_index(keep_archived=False):
+    if keep_archived:
+        column = 'bill_id' if _is_postgres() else 'rowid'
+        db.session.execute(text(f"DELETE FROM bill_search WHERE {column} NOT IN (SELECT id FROM archived_bill)"))
+    else:
+        db.session.execute(text("DELETE FROM bill_search"))
+
+def rebuild_search_index(keep_archived=False):
+    """Re-index every live bill; returns the number indexed.
+
+    Archived bills' items only exist in their segments, so pass keep_archived=True
+    to keep their index rows instead of dropping them.
+    """
+    clear_search_index(keep_archived)
+    count = 0
+    last_id = 0
+    while True:
+        bills = Bill.query.filter(Bill.id > last_id).order_by(Bill.id).limit(REBUILD_BATCH).all()
+        if not bills:
+            break
+        items = {}
+        for item in BillItem.query.filter(BillItem.bill_id.in_([b.id for b in bills])).order_by(BillItem.id):
+            items.setdefault(item.bill_id, []).append(item)
+        index_bills([(bill, items.get(bill.id, [])) for bill in bills])
+        count += len(bills)
+        last_id = bills[-1].id
+    return count
+
+def query_terms(q):
+    return re.findall(r'\w+', (q or '').lower())[:10]
+
+def search_bills(q, start=None, end=None, page=1, per_page=SEARCH_PAGE_SIZE):
+    """Ranked page of (bill, score) matching every term of q as a prefix; returns (results, has_next)"""
+    terms = query_terms(q)
+    if not terms:
+        return [], False
+
+    params = {'limit': per_page + 1, 'offset': (page - 1) * per_page}
+    # Hits resolve to a live bill or to an archived one
+    bill_date = 'COALESCE(bill.date, archived_bill.date)'
+    filters = ' AND (bill.id IS NOT NULL OR archived_bill.id IS NOT NULL)'
+    if start is not None:
+        filters += f' AND {bill_date} >= :start'
+        params['start'] = start
+    if end is not None:
+        filters += f' AND {bill_date} < :end'
+        params['end'] = end
+
+    if _is_postgres():
+        params['match'] = ' & '.join(f"{term}:*" for term in terms)
+        statement = text(
+            "SELECT s.bill_id, ts_rank(s.tsv, q) AS score"
+            " FROM bill_search s CROSS JOIN to_tsquery('simple', :match) q"
+            " LEFT JOIN bill ON bill.id = s.bill_id LEFT JOIN archived_bill ON archived_bill.id = s.bill_id"
+            f" WHERE s.tsv @@ q{filters}"
+            f" ORDER BY score DESC, {bill_date} DESC LIMIT :limit OFFSET :offset"
+        )
+    else:
+        params['match'] = ' '.join(f'"{term}"*' for term in terms)
+        # bm25 is lower-is-better; negate it so both dialects rank higher-is-better
+        statement = text(
+            "SELECT bill_search.rowid AS bill_id, -bm25(bill_search, 10.0, 10.0, 4.0, 1.0) AS score"
+            " FROM bill_search LEFT JOIN bill ON bill.id = bill_search.rowid"
+            " LEFT JOIN archived_bill ON archived_bill.id = bill_search.rowid"
+            f" WHERE bill_search MATCH :match{filters}"
+            f" ORDER BY score DESC, {bill_date} DESC LIMIT :limit OFFSET :offset"
+        )
+    statement = statement.bindparams(*(bindparam(name, type_=DateTime) for name in ('start', 'end') if name in params))
+    ranked = db.session.execute(statement, params).all()
+    has_next = len(ranked) > per_page
+    ranked = ranked[:per_page]
+    if not ranked:
+        return [], False
+    ids = [bill_id for bill_id, _ in ranked]
+    bills = {bill.id: bill for bill in Bill.query.filter(Bill.id.in_(ids))}
+    missing = [bill_id for bill_id in ids if bill_id not in bills]
+    if missing:
+        # Archived bills come back as their index entries (number, date, location, party, total)
+        bills.update({entry.id: entry for entry in ArchivedBill.query.filter(ArchivedBill.id.in_(missing))})
+    return [(bills[bill_id], score) for bill_id, score in ranked if bill_id in bills], has_next
@@ -0,0 +1,194 @@
+"""Storage helpers: a local filesystem stand-in for the Supabase bucket and a
+disk cache in front of it.
+
+LocalBucket exposes the subset of the supabase-py bucket API the app uses
+(upload, download, remove) so code written against `client.storage.from_(bucket)`
+runs unchanged in local development and in tests. `download_range` reads part of
+an object from either kind of bucket.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+
+class LocalBucket:
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, path):
+        full_path = os.path.abspath(os.path.join(self.root, path))
+        if not full_path.startswith(self.root + os.sep):
+            raise ValueError(f"Invalid storage path: {path}")
+        return full_path
+
+    def upload(self, path, file, file_options=None):
+        full_path = self._path(path)
+        upsert = str((file_options or {}).get('upsert', 'false')).lower() == 'true'
+        if os.path.exists(full_path) and not upsert:
+            raise FileExistsError(f"{path} already exists")
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        if isinstance(file, (bytes, bytearray)):
+            data = bytes(file)
+        else:
+            with open(file, 'rb') as f:
+                data = f.read()
+        tmp_path = f"{full_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, full_path)
+        return {'Key': path}
+
+    def download(self, path):
+        with open(self._path(path), 'rb') as f:
+            return f.read()
+
+    def download_range(self, path, offset, length):
+        with open(self._path(path), 'rb') as f:
+            f.seek(offset)
+            return f.read(length)
+
+    def remove(self, paths):
+        for path in paths:
+            full_path = self._path(path)
+            if os.path.exists(full_path):
+                os.remove(full_path)
+        return [{'name': path} for path in paths]
+
+
+def download_range(bucket, path, offset, length):
+    """Bytes [offset, offset + length) of a bucket object, with a ranged GET where the bucket allows one"""
+    if hasattr(bucket, 'download_range'):
+        return bucket.download_range(path, offset, length)
+    request = getattr(bucket, '_request', None)
+    if request is None:
+        return bucket.download(path)[offset:offset + length]
+    # supabase-py has no ranged download; its request helper carries the bucket's auth headers
+    response = request('GET', f"object/{bucket._get_final_path(path)}",
+                       headers={'Range': f'bytes={offset}-{offset + length - 1}'})
+    if response.status_code == 206:
+        return response.content
+    return response.content[offset:offset + length]  # Range ignored: the whole object came back
+
+
+class DiskLRUCache:
+    """Size-bounded, least-recently-used file cache for bucket objects.
+
+    Entries are stored as `<key hash>-<content hash>` so the ETag survives restarts
+    without re-reading files. Recency is tracked in memory and mirrored to file
+    mtimes, which seed the order when the cache directory is rescanned.
+    """
+
+    def __init__(self, root, max_bytes):
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key hash -> (filename, size, etag), oldest first
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(self.root, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        found = []
+        for name in os.listdir(self.root):
+            if name.endswith('.tmp') or '-' not in name:
+                continue
+            path = os.path.join(self.root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            key_hash, etag = name.split('-', 1)
+            found.append((stat.st_mtime, key_hash, name, stat.st_size, etag))
+        for _, key_hash, name, size, etag in sorted(found):
+            self.entries[key_hash] = (name, size, etag)
+            self.total_bytes += size
+
+    @staticmethod
+    def _key_hash(key):
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+
+    def get(self, key):
+        """(path, etag) for a cached key, or None"""
+        key_hash = self._key_hash(key)
+        with self.lock:
+            entry = self.entries.get(key_hash)
+            if entry is None:
+                self.misses += 1
+                return None
+            path = os.path.join(self.root, entry[0])
+            if not os.path.exists(path):
+                del self.entries[key_hash]
+                self.total_bytes -= entry[1]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key_hash)
+            self.hits += 1
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path, entry[2]
+
+    def put(self, key, data):
+        """Store bytes for a key, evicting least-recently-used entries; returns (path, etag)"""
+        key_hash = self._key_hash(key)
+        etag = hashlib.sha256(data).hexdigest()[:32]
+        name = f"{key_hash}-{etag}"
+        path = os.path.join(self.root, name)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self.lock:
+            previous = self.entries.pop(key_hash, None)
+            if previous:
+                self.total_bytes -= previous[1]
+                if previous[0] != name:
+                    self._remove_file(previous[0])
+            self.entries[key_hash] = (name, len(data), etag)
+            self.total_bytes += len(data)
+            while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+                _, (old_name, old_size, _) = self.entries.popitem(last=False)
+                self.total_bytes -= old_size
+                self.evictions += 1
+                self._remove_file(old_name)
+        return path, etag
+
+    def discard(self, key):
+        """Drop a key if it is cached"""
+        with self.lock:
+            entry = self.entries.pop(self._key_hash(key), None)
+            if entry:
+                self.total_bytes -= entry[1]
+                self._remove_file(entry[0])
+
+    def clear(self):
+        with self.lock:
+            for name, _, _ in self.entries.values():
+                self._remove_file(name)
+            self.entries.clear()
+            self.total_bytes = 0
+
+    def _remove_file(self, name):
+        try:
+            os.remove(os.path.join(self.root, name))
+        except OSError:
+            pass
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else None
+            }
@@ -0,0 +1,85 @@
+"""Image upload pipeline: content-addressed, metadata-free, pre-sized variants.
+
+An upload is hashed, decoded, turned upright from its EXIF orientation and
+re-encoded without metadata into one file per variant under
+`<kind>/<digest>/<variant>.<ext>`. Identical uploads hash to the same paths, so
+uploading the same photo again stores nothing new. The reference saved on the
+model is `<kind>/<digest>.<ext>`; each view asks `variant_path` for the size it needs.
+"""
+import hashlib
+import io
+import posixpath
+import re
+
+# Longest side in pixels: print (opened for printing), screen (150 CSS px at 2x), thumb (settings preview)
+VARIANTS = {'print': 600, 'screen': 300, 'thumb': 96}
+JPEG_QUALITY = 85
+# Line art (QR codes, logos) is kept as a grayscale PNG with this many levels
+LINE_ART_LEVELS = 4
+MIMETYPES = {'jpg': 'image/jpeg', 'png': 'image/png'}
+
+# Bucket prefixes that hold bill data (rendered bills, archive segments), never served by /uploads
+PRIVATE_PREFIXES = ('bills/', 'archive/')
+
+_REFERENCE = re.compile(r'(?P<kind>[a-z_]+)/(?P<digest>[0-9a-f]{32})\.(?P<ext>jpg|png)')
+
+def is_processed(reference):
+    return bool(reference and _REFERENCE.fullmatch(reference))
+
+def is_public(path):
+    """Whether /uploads may serve this bucket path without a login"""
+    return not posixpath.normpath(path).lstrip('/').startswith(PRIVATE_PREFIXES)
+
+def variant_path(reference, variant):
+    """Storage path of one variant of a processed upload; older raw uploads are returned unchanged"""
+    match = _REFERENCE.fullmatch(reference or '')
+    if not match:
+        return reference
+    return f"{match['kind']}/{match['digest']}/{variant}.{match['ext']}"
+
+def process_image(data, kind):
+    """(reference, {variant: bytes}) for raw upload bytes; raises ValueError if they aren't an image"""
+    from PIL import Image, ImageOps, UnidentifiedImageError  # imported on first use, off the cold-start path
+    digest = hashlib.sha256(data).hexdigest()[:32]
+    try:
+        with Image.open(io.BytesIO(data)) as source:
+            source.seek(0)  # first frame of animations
+            image = ImageOps.exif_transpose(source)
+            has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+            image = image.convert('RGBA' if has_alpha else 'RGB')
+    except (UnidentifiedImageError, OSError) as e:
+        raise ValueError(f"Not a valid image: {e}")
+
+    # Line art becomes a few-level grayscale PNG (a fraction of a JPEG's size, with
+    # crisp edges), other transparent images a PNG and photos a JPEG
+    line_art = not has_alpha and _is_line_art(image)
+    if line_art:
+        image = image.convert('L')
+    ext = 'png' if has_alpha or line_art else 'jpg'
+    variants = {}
+    for name, size in VARIANTS.items():
+        resized = image.copy()
+        resized.thumbnail((size, size), Image.LANCZOS)
+        out = io.BytesIO()
+        # A fresh encode from pixel data carries no EXIF, GPS or ICC metadata
+        if line_art:
+            resized.quantize(LINE_ART_LEVELS).save(out, 'PNG', optimize=True)
+        elif ext == 'png':
+            resized.save(out, 'PNG', optimize=True)
+        else:
+            resized.save(out, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+        variants[name] = out.getvalue()
+    return f"{kind}/{digest}.{ext}", variants
+
+def _is_line_art(image):
+    """Colourless and nearly all pixels close to black or white, allowing for JPEG noise"""
+    from PIL import ImageChops
+    gray = image.convert('L')
+    if max(high for _, high in ImageChops.difference(image, gray.convert('RGB')).getextrema()) > 24:
+        return False
+    histogram = gray.histogram()
+    return sum(histogram[:64]) + sum(histogram[192:]) >= 0.95 * sum(histogram)
+
+def mimetype_for(reference):
+    match = _REFERENCE.fullmatch(reference or '')
+    return MIMETYPES[match['ext']] if match else 'application/octet-stream'
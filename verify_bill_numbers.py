@@ -0,0 +1,67 @@
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from index import app, db, Bill
+import reports
+import search
+
+CONCURRENT_REQUESTS = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+WORKERS = 32
+
+PAYLOAD = {
+    'items': [{'name': 'Vanilla', 'quantity': 2, 'price': 30, 'total': 60, 'description': ''}],
+    'grand_total': 60,
+    'advance_amount': 0,
+    'discount_amount': 0,
+    'balance_amount': 60,
+    'party_number': 'CONCURRENCY-TEST',
+    'location': 'Verify'
+}
+
+def make_clients(count):
+    # One login, shared by every client, so the run doesn't depend on login throttling
+    first = app.test_client()
+    first.get('/login')  # triggers lazy init
+    first.post('/login', data={'username': 'admin', 'password': 'admin123'})
+    session_cookie = first.get_cookie('session')
+    clients = [first]
+    for _ in range(count - 1):
+        client = app.test_client()
+        client.set_cookie('session', session_cookie.value)
+        clients.append(client)
+    return clients
+
+def fire(client):
+    response = client.post('/generate_bill', json=PAYLOAD)
+    data = response.get_json(silent=True) or {}
+    return response.status_code, data.get('bill_number'), data.get('message')
+
+def verify_concurrent_bill_numbers():
+    print(f"--- Firing {CONCURRENT_REQUESTS} concurrent /generate_bill calls ({WORKERS} threads) ---")
+    clients = make_clients(WORKERS)
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        results = list(pool.map(fire, (clients[i % WORKERS] for i in range(CONCURRENT_REQUESTS))))
+
+    failures = [r for r in results if r[0] != 200]
+    numbers = [r[1] for r in results if r[0] == 200]
+    duplicates = len(numbers) - len(set(numbers))
+
+    print(f"Succeeded: {len(numbers)} | Failed: {len(failures)} | Duplicate numbers: {duplicates}")
+    for status, _, message in failures[:5]:
+        print(f"  {status}: {message}")
+
+    with app.app_context():
+        # Clean up the bills created by this run, taking them back out of the sales summary and search index
+        bills = Bill.query.filter_by(party_number='CONCURRENCY-TEST').all()
+        reports.apply_sales_summary([(bill, bill.items) for bill in bills], sign=-1)
+        search.remove_bills([bill.id for bill in bills])
+        for bill in bills:
+            db.session.delete(bill)
+        db.session.commit()
+
+    if failures or duplicates:
+        print("FAILED")
+        sys.exit(1)
+    print("PASSED: every request got a unique bill number")
+
+if __name__ == '__main__':
+    verify_concurrent_bill_numbers()
@@ -0,0 +1,75 @@
+import json
+import sys
+from index import app, db, Item, run_migrations
+import catalog
+
+# Rows with different column sets in one batch: the partial row must not reset the fields it leaves out
+ROWS = [
+    {'name': 'VERIFY-IMPORT-ITEM', 'description': 'updated description'},
+    {'name': 'VERIFY-IMPORT-NEW', 'price': 12.0},
+]
+# Blank CSV cells leave the item's current values alone, like a column left out
+CSV_ROWS = "name,price,category,is_flavor,description\nVERIFY-IMPORT-ITEM,,, ,updated description\n"
+
+def verify_partial_import():
+    print("--- Importing a partial row next to a row with other columns ---")
+    with app.app_context():
+        run_migrations()
+        try:
+            db.session.add(Item(name='VERIFY-IMPORT-ITEM', price=30.0, category='Ice Cream', is_flavor=True,
+                                description='original description'))
+            db.session.flush()
+            created, updated = catalog.import_catalog(catalog.parse_catalog(json.dumps(ROWS), 'json'))
+            db.session.expire_all()
+            existing = Item.query.filter_by(name='VERIFY-IMPORT-ITEM').one()
+            new = Item.query.filter_by(name='VERIFY-IMPORT-NEW').one()
+            print(f"Created: {created} | Updated: {updated}")
+            print(f"Existing item: price={existing.price} category={existing.category} "
+                  f"is_flavor={existing.is_flavor} description={existing.description!r}")
+            print(f"New item: price={new.price} category={new.category} is_flavor={new.is_flavor}")
+            ok = ((created, updated) == (1, 1)
+                  and (existing.price, existing.category, existing.is_flavor) == (30.0, 'Ice Cream', True)
+                  and existing.description == 'updated description'
+                  and (new.price, new.category, new.is_flavor, new.description) == (12.0, 'Main', False, None))
+        finally:
+            # Nothing from this check is kept
+            db.session.rollback()
+
+    if not ok:
+        print("FAILED")
+        sys.exit(1)
+    print("PASSED: the partial row only changed the fields it carried")
+
+def verify_csv_blank_cells():
+    print("--- Importing a CSV row with blank cells ---")
+    with app.app_context():
+        run_migrations()
+        try:
+            db.session.add(Item(name='VERIFY-IMPORT-ITEM', price=30.0, category='Ice Cream', is_flavor=True,
+                                description='original description'))
+            db.session.flush()
+            catalog.import_catalog(catalog.parse_catalog(CSV_ROWS, 'csv'))
+            db.session.expire_all()
+            item = Item.query.filter_by(name='VERIFY-IMPORT-ITEM').one()
+            print(f"Item: price={item.price} category={item.category} "
+                  f"is_flavor={item.is_flavor} description={item.description!r}")
+            ok = ((item.price, item.category, item.is_flavor) == (30.0, 'Ice Cream', True)
+                  and item.description == 'updated description')
+        finally:
+            db.session.rollback()
+
+    try:
+        catalog.parse_catalog(json.dumps([{'name': 'x' * 101}]), 'json')
+        print("Overlong name was accepted")
+        ok = False
+    except ValueError as e:
+        print(f"Overlong name rejected: {e}")
+
+    if not ok:
+        print("FAILED")
+        sys.exit(1)
+    print("PASSED: blank cells kept the current values and overlong values are rejected")
+
+if __name__ == '__main__':
+    verify_partial_import()
+    verify_csv_blank_cells()